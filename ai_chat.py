@@ -1,72 +1,425 @@
+import asyncio
 import base64
+import hashlib
 import json
+import mimetypes
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
 from typing import Optional
-import requests
+import aiohttp
+from async_runtime import get_runtime
+from config_store import load_config
+from result_cache import get_result_cache, make_cache_key
+from log_index import get_log_index
+from log_store import rotate_log
+from log_writer import get_log_writer
+from metrics import get_metrics
 
 
-import sys
+DEFAULT_NETWORK_CONFIG = {
+    "pool_size": 8,
+    "keep_alive": True,
+    "preconnect": True,
+    "idle_rewarm": 30,
+    "timeout": 60,
+    "stream_chat": True,
+}
 
-def get_base_dir():
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    return os.path.dirname(os.path.abspath(__file__))
+# aiohttp sessions belong to the shared event loop and are only touched from it.
+_sessions = {}
+_sessions_last_used = {}
+_log_lock = threading.Lock()
+# (base_url, model) -> consecutive failed batch requests; batching is skipped for a
+# model once it reaches BATCH_MAX_FAILURES, until the process restarts.
+_batch_failures = {}
+BATCH_MAX_FAILURES = 2
+# Responses meaning the request itself was refused (bad request, payload too large,
+# unprocessable), as opposed to auth or rate limits that a single call would also hit.
+BATCH_REJECT_STATUSES = (400, 413, 422)
+
+BATCH_INSTRUCTION = (
+    "下面依次给出 {count} 张应用窗口截图，请按每张图片各自的要求分别分析。"
+    "只输出一个 JSON 对象，格式为 {{\"results\": [{{\"id\": 图片编号, \"behavior\": \"该图片的分析结果\"}}]}}，"
+    "每张图片一项，不要输出其他内容。"
+)
+
+
+def load_network_config():
+    return load_config("network_config", DEFAULT_NETWORK_CONFIG)
+
+
+def _session_key(base_url: str, api_key: str):
+    return (base_url.rstrip("/"), api_key)
+
+
+async def get_session(base_url: str, api_key: str) -> aiohttp.ClientSession:
+    # One pooled keep-alive session per endpoint/key, shared by every client in the process.
+    key = _session_key(base_url, api_key)
+    session = _sessions.get(key)
+    if session is None or session.closed:
+        cfg = load_network_config()
+        keep_alive = bool(cfg.get("keep_alive", True))
+        connector = aiohttp.TCPConnector(
+            limit=max(1, int(cfg.get("pool_size", 8))),
+            force_close=not keep_alive,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+        )
+        _sessions[key] = session
+    _sessions_last_used[key] = time.monotonic()
+    return session
+
+
+def parse_batch_reply(reply: str) -> dict:
+    # {id: behavior} from a batch answer: an object with "results", a bare array or an
+    # {id: behavior} object, possibly inside code fences or surrounded by text. Each
+    # "[" or "{" is tried as the start of the JSON value until one parses.
+    text = (reply or "").strip()
+    decoder = json.JSONDecoder()
+    for start, ch in enumerate(text):
+        if ch not in "[{":
+            continue
+        try:
+            obj, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            continue
+        parsed = _batch_results(obj)
+        if parsed:
+            return parsed
+    return {}
+
+
+def _batch_results(obj):
+    results = obj.get("results", obj) if isinstance(obj, dict) else obj
+    parsed = {}
+    if isinstance(results, list):
+        for r in results:
+            if isinstance(r, dict) and r.get("behavior"):
+                try:
+                    parsed[int(r.get("id"))] = str(r["behavior"]).strip()
+                except (TypeError, ValueError):
+                    continue
+    elif isinstance(results, dict):
+        for k, v in results.items():
+            if v:
+                try:
+                    parsed[int(k)] = str(v).strip()
+                except (TypeError, ValueError):
+                    continue
+    return parsed
+
+
+def preconnect(base_url: str, api_key: str, force: bool = False):
+    # Opens a pooled connection in the background so the next request skips DNS/TCP/TLS setup.
+    if not base_url or not api_key:
+        return
+    key = _session_key(base_url, api_key)
+    cfg = load_network_config()
+    if not force:
+        last = _sessions_last_used.get(key)
+        if last is not None and time.monotonic() - last < float(cfg.get("idle_rewarm", 30)):
+            return
+
+    async def _run():
+        try:
+            session = await get_session(base_url, api_key)
+            async with session.head(f"{key[0]}/v1/models", timeout=aiohttp.ClientTimeout(total=10)):
+                pass
+        except Exception as e:
+            print(str(e))
+
+    get_runtime().submit(_run())
+
+
+def preconnect_from_config():
+    if not load_network_config().get("preconnect", True):
+        return
+    cfg = load_config("model_config", {})
+    preconnect(cfg.get("base_url", ""), cfg.get("api_key", ""), force=True)
+
+
+async def _close_sessions():
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    _sessions_last_used.clear()
+    for session in sessions:
+        try:
+            await session.close()
+        except Exception:
+            pass
+
+
+def close_sessions():
+    # Cancels in-flight requests, closes the pooled sessions and stops the event loop.
+    get_runtime().stop(_close_sessions())
 
 class AIChatClient:
-    def __init__(self, api_key: str, base_url: str, model: str, system_prompt: Optional[str] = None):
+    # The request methods are coroutines run on the shared event loop (achat,
+    # achat_stream). chat() is a blocking wrapper around achat for callers on ordinary
+    # threads.
+    def __init__(self, api_key: str, base_url: str, model: str, system_prompt: Optional[str] = None, use_cache: bool = True):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self.model = model
         self.system_prompt = system_prompt or "你是 ScreenGuardian 的桌宠助手，简洁准确地回答用户问题。"
+        self.timeout = float(load_network_config().get("timeout", 60))
+        self.cache = get_result_cache() if use_cache else None
+        self.last_timing = None
 
-    def _build_image_part(self, image_path: Optional[str]):
-        if not image_path:
-            return None
-        if not os.path.isfile(image_path):
-            return None
-        with open(image_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-        return {
+    def _build_image_part(self, image_path: Optional[str] = None, image=None):
+        # The data URL carries a placeholder token; the base64 bytes are spliced into
+        # the serialised body by _encode_body so the image is never copied through json.
+        if image is not None:
+            mime, b64 = image.mime, image.b64
+        else:
+            if not image_path:
+                return None
+            if not os.path.isfile(image_path):
+                return None
+            with open(image_path, "rb") as f:
+                b64 = base64.b64encode(f.read())
+            mime = mimetypes.guess_type(image_path)[0] or "image/png"
+        token = f"@@image-{uuid.uuid4().hex}@@"
+        part = {
             "type": "image_url",
             "image_url": {
-                "url": f"data:image/png;base64,{b64}"
+                "url": f"data:{mime};base64,{token}"
             },
         }
+        return part, (token.encode("ascii"), b64)
 
-    def chat(self, user_text: str, image_path: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 1024) -> str:
-        url = f"{self.base_url}/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+    def _encode_body(self, payload: dict, blobs) -> bytes:
+        metrics = get_metrics()
+        with metrics.timer("chat.encode_body"):
+            body = json.dumps(payload).encode("utf-8")
+            if blobs:
+                pieces = []
+                for token, b64 in blobs:
+                    head, body = body.split(token, 1)
+                    pieces.append(head)
+                    pieces.append(b64)
+                pieces.append(body)
+                body = b"".join(pieces)
+        metrics.count("chat.upload_bytes", len(body))
+        return body
+
+    def _prepare(self, user_text: str, image_path: Optional[str], temperature: float, max_tokens: int, image=None, history=None):
+        with get_metrics().timer("chat.prepare"):
+            return self._prepare_payload(user_text, image_path, temperature, max_tokens, image, history)
+
+    def _prepare_payload(self, user_text: str, image_path: Optional[str], temperature: float, max_tokens: int, image=None, history=None):
         content_parts = [{"type": "text", "text": user_text}]
-        image_part = self._build_image_part(image_path)
-        if image_part:
+        blobs = []
+        built = self._build_image_part(image_path, image)
+        if built:
+            image_part, blob = built
             content_parts.append(image_part)
+            blobs.append(blob)
         payload = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": self.system_prompt},
+                *(history or []),
                 {"role": "user", "content": content_parts},
             ],
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
-        resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-        if resp.status_code != 200:
-            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
-        data = resp.json()
+        if image is not None:
+            image_path = image.label or "内存图片"
+        cache_key = None
+        if self.cache is not None and blobs and not history:
+            # Only vision requests are cached; plain chat should stay conversational.
+            digest = image.digest if image is not None else hashlib.sha256(blobs[0][1]).hexdigest()
+            cache_key = make_cache_key(digest, user_text, self.system_prompt, self.model, temperature)
+        return payload, blobs, image_path, cache_key
+
+    async def _post(self, payload: dict, blobs, stream: bool = False):
+        body = self._encode_body(payload, blobs)
+        session = await get_session(self.base_url, self.api_key)
+        if stream:
+            # A long answer may stream for longer than the timeout; only stalls count.
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        else:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # Upload plus the model's time until the response headers arrive
+        with get_metrics().timer("chat.stream_open" if stream else "chat.post"):
+            resp = await session.post(f"{self.base_url}/v1/chat/completions", data=body, timeout=timeout)
+        if resp.status != 200:
+            text = await resp.text()
+            resp.release()
+            error = RuntimeError(f"HTTP {resp.status}: {text}")
+            error.status = resp.status
+            raise error
+        return resp
+
+    async def _cache_get(self, cache_key):
+        if cache_key is None:
+            return None
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        get_metrics().count("chat.cache_hit" if cached is not None else "chat.cache_miss")
+        return cached
+
+    async def achat(self, user_text: str, image_path: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 1024, image=None, history=None) -> str:
+        payload, blobs, image_path, cache_key = self._prepare(user_text, image_path, temperature, max_tokens, image, history)
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            self._write_log(user_text=user_text, image_path=image_path, reply=cached, cached=True)
+            return cached
+        metrics = get_metrics()
+        with metrics.timer("chat.request"):
+            resp = await self._post(payload, blobs)
+            try:
+                with metrics.timer("chat.read_response"):
+                    data = await resp.json(content_type=None)
+            finally:
+                resp.release()
         if "choices" not in data or not data["choices"]:
             raise RuntimeError("Empty response")
         reply = data["choices"][0]["message"]["content"]
+        if cache_key is not None and reply:
+            await asyncio.to_thread(self.cache.put, cache_key, reply)
         self._write_log(user_text=user_text, image_path=image_path, reply=reply)
         return reply
 
-    def _write_log(self, user_text: str, image_path: Optional[str], reply: str):
-        log_dir = os.path.join(get_base_dir(), "data", "log")
-        os.makedirs(log_dir, exist_ok=True)
-        path = os.path.join(log_dir, "logs.jsonl")
+    async def achat_stream(self, user_text: str, image_path: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 1024, image=None, history=None):
+        # Yields reply fragments as the server streams them ("stream": true, SSE). The
+        # assembled reply is logged once the stream ends, together with the time to
+        # first token; the same numbers are left in self.last_timing.
+        payload, blobs, image_path, cache_key = self._prepare(user_text, image_path, temperature, max_tokens, image, history)
+        started = time.perf_counter()
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            self.last_timing = {"ttft_ms": 0, "total_ms": int((time.perf_counter() - started) * 1000)}
+            self._write_log(user_text=user_text, image_path=image_path, reply=cached, cached=True)
+            yield cached
+            return
+        payload["stream"] = True
+        resp = await self._post(payload, blobs, stream=True)
+        parts = []
+        ttft = None
+        complete = False
+        try:
+            async for line in resp.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except Exception:
+                    continue
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content") or ""
+                if not text:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                parts.append(text)
+                yield text
+            complete = True
+        finally:
+            resp.release()
+            reply = "".join(parts)
+            self.last_timing = {
+                "ttft_ms": int(ttft * 1000) if ttft is not None else None,
+                "total_ms": int((time.perf_counter() - started) * 1000),
+            }
+            metrics = get_metrics()
+            if ttft is not None:
+                metrics.observe("chat.ttft", ttft * 1000)
+            metrics.observe("chat.stream_total", (time.perf_counter() - started) * 1000)
+            if reply:
+                # A stream abandoned half-way is still logged but never cached. This
+                # also runs on cancellation, so it stays synchronous.
+                if complete and cache_key is not None:
+                    self.cache.put(cache_key, reply)
+                self._write_log(user_text=user_text, image_path=image_path, reply=reply, timing=self.last_timing)
+
+    def supports_batch(self) -> bool:
+        return _batch_failures.get((self.base_url, self.model), 0) < BATCH_MAX_FAILURES
+
+    async def achat_batch(self, items, temperature: float = 0.2):
+        # items: [(user_text, image), ...]. Sends every uncached image in one request
+        # with its own prompt and returns {index: reply} for the answers that could be
+        # parsed; callers fall back to achat() for the rest. Parsed answers are cached
+        # under the same keys single-image calls use.
+        replies = {}
+        pending = []
+        for index, (user_text, image) in enumerate(items):
+            cache_key = None
+            if self.cache is not None:
+                cache_key = make_cache_key(image.digest, user_text, self.system_prompt, self.model, temperature)
+                cached = await self._cache_get(cache_key)
+                if cached is not None:
+                    replies[index] = cached
+                    continue
+            pending.append((index, user_text, image, cache_key))
+        if not pending:
+            return replies
+        content_parts = [{"type": "text", "text": BATCH_INSTRUCTION.format(count=len(pending))}]
+        blobs = []
+        for number, (index, user_text, image, _) in enumerate(pending, 1):
+            content_parts.append({"type": "text", "text": f"图片 {number} 的要求：{user_text or '描述用户正在做什么'}"})
+            part, blob = self._build_image_part(image=image)
+            content_parts.append(part)
+            blobs.append(blob)
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": content_parts},
+            ],
+            "temperature": temperature,
+            "max_tokens": min(4096, 256 + 512 * len(pending)),
+        }
+        failures_key = (self.base_url, self.model)
+        try:
+            with get_metrics().timer("chat.batch_request"):
+                resp = await self._post(payload, blobs)
+                try:
+                    data = await resp.json(content_type=None)
+                finally:
+                    resp.release()
+            reply = data["choices"][0]["message"]["content"] if data.get("choices") else ""
+        except RuntimeError as e:
+            if getattr(e, "status", None) in BATCH_REJECT_STATUSES:
+                # Most likely the model rejects several images in one message
+                _batch_failures[failures_key] = _batch_failures.get(failures_key, 0) + 1
+            raise
+        parsed = parse_batch_reply(reply)
+        if parsed:
+            _batch_failures.pop(failures_key, None)
+        else:
+            _batch_failures[failures_key] = _batch_failures.get(failures_key, 0) + 1
+        prompt_text = "\n".join(p["text"] for p in content_parts if p["type"] == "text")
+        labels = ", ".join(image.label or "内存图片" for _, _, image, _ in pending)
+        self._write_log(user_text=prompt_text, image_path=labels, reply=reply)
+        for number, (index, _, _, cache_key) in enumerate(pending, 1):
+            behavior = parsed.get(number)
+            if not behavior:
+                continue
+            replies[index] = behavior
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, behavior)
+        return replies
+
+    def chat(self, user_text: str, image_path: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 1024, image=None, history=None) -> str:
+        return get_runtime().run(self.achat(user_text, image_path, temperature, max_tokens, image, history))
+
+    def _write_log(self, user_text: str, image_path: Optional[str], reply: str, cached: bool = False, timing: Optional[dict] = None):
         entry = {
             "time": datetime.now().isoformat(timespec="seconds"),
             "model": self.model,
@@ -75,16 +428,41 @@ class AIChatClient:
             "image": image_path if image_path else "无上传图片",
             "reply": reply,
         }
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if cached:
+            entry["cached"] = True
+        if timing:
+            entry.update(timing)
+        # Written by the background log writer. This runs on the event loop, so a full
+        # queue drops the oldest entry rather than blocking every request in flight.
+        get_log_writer().submit("calls", entry, block=False)
+
+
+def _write_log_batch(entries, sync):
+    index = get_log_index()
+    data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+    with _log_lock:
+        os.makedirs(index.log_dir, exist_ok=True)
+        with open(index.log_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            # Index before rotating so the rows can simply be relabelled
+            index.sync()
+            if rotate_log(log_dir=index.log_dir):
+                index.sync()
+        except Exception as e:
+            print(str(e))
+
+
+get_log_writer().register("calls", _write_log_batch)
 
 
 def main():
-    cfg_path = os.path.join(get_base_dir(), "data", "config", "model_config.json")
-    if not os.path.isfile(cfg_path):
+    cfg = load_config("model_config")
+    if not isinstance(cfg, dict):
         raise RuntimeError("缺少模型配置文件 data/config/model_config.json")
-    with open(cfg_path, "r", encoding="utf-8") as f:
-        cfg = json.load(f)
     api_key = cfg.get("api_key", "")
     base_url = cfg.get("base_url", "")
     sys_cfg = cfg.get("system_call", {}) or {}
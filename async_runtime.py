@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class AsyncRuntime:
+    # One asyncio event loop on a daemon thread, shared by every model request in the
+    # process. Other threads hand it coroutines and get concurrent.futures.Future back;
+    # cancelling such a future cancels the task on the loop.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._futures = set()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, args=(self._loop, ready), name="async-runtime", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run(self, loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def in_loop_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def run(self, coro, timeout=None):
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() called from the event loop thread")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def cancel_all(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def stop(self, cleanup=None, timeout=5):
+        # Cancels in-flight work, runs the optional cleanup coroutine, then stops the loop.
+        with self._lock:
+            loop, thread = self._loop, self._thread
+        if loop is None or loop.is_closed():
+            if cleanup is not None:
+                cleanup.close()
+            return
+        self.cancel_all()
+        if cleanup is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(cleanup, loop).result(timeout)
+            except Exception as e:
+                print(str(e))
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            if self._loop is loop:
+                self._loop = None
+                self._thread = None
+
+
+_runtime = AsyncRuntime()
+
+
+def get_runtime():
+    return _runtime
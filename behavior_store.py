@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config_store import get_base_dir
+from log_writer import get_log_writer
+
+
+def _parse_time(text):
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+class BehaviorStore:
+    # Append-only behavior log in SQLite: appends, tail reads and time-range reads
+    # all go through the rowid/ts indexes instead of loading the whole history.
+    # Rows are only ever appended or all deleted at once, so ids are contiguous and
+    # row i of the log has id first + i.
+    def __init__(self, path=None, legacy_path=None):
+        log_dir = os.path.join(get_base_dir(), "data", "log")
+        self.path = path or os.path.join(log_dir, "behavior.db")
+        self.legacy_path = legacy_path or os.path.join(log_dir, "behavior-log.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS behaviors ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, time TEXT NOT NULL, "
+            "app TEXT NOT NULL DEFAULT '', behavior TEXT NOT NULL, extra TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS behaviors_ts ON behaviors(ts)")
+        self._conn.commit()
+        self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        # One-time import of the old behavior-log.json array.
+        if not os.path.isfile(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                arr = json.load(f)
+        except Exception:
+            arr = []
+        if isinstance(arr, list) and arr:
+            self.append([e for e in arr if isinstance(e, dict)])
+        try:
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        except Exception:
+            pass
+
+    def append(self, entries):
+        rows = []
+        now = time.time()
+        for e in entries:
+            e = dict(e)
+            t = str(e.pop("time", "") or datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M"))
+            ts = e.pop("ts", None) or _parse_time(t) or now
+            app = str(e.pop("app", "") or "")
+            behavior = str(e.pop("behavior", "") or "")
+            extra = json.dumps(e, ensure_ascii=False) if e else None
+            rows.append((ts, t, app, behavior, extra))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO behaviors (ts, time, app, behavior, extra) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def append_async(self, entries):
+        # Queued for the background log writer, which batches them into one transaction.
+        for e in entries:
+            get_log_writer().submit("behaviors", e)
+
+    def _to_entry(self, row):
+        entry = {"id": row[0], "ts": row[1], "time": row[2], "app": row[3], "behavior": row[4]}
+        if row[5]:
+            try:
+                entry.update(json.loads(row[5]))
+            except Exception:
+                pass
+        return entry
+
+    def tail(self, n):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, ts, time, app, behavior, extra FROM behaviors ORDER BY id DESC LIMIT ?", (int(n),)
+            ).fetchall()
+        return [self._to_entry(r) for r in reversed(rows)]
+
+    def range(self, start_ts=None, end_ts=None, limit=None):
+        sql = "SELECT id, ts, time, app, behavior, extra FROM behaviors WHERE ts >= ? AND ts < ? ORDER BY ts, id"
+        params = [start_ts if start_ts is not None else float("-inf"), end_ts if end_ts is not None else float("inf")]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_entry(r) for r in rows]
+
+    def rows(self, after_id, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, ts, time, app, behavior, extra FROM behaviors WHERE id > ? ORDER BY id LIMIT ?",
+                (int(after_id), int(limit)),
+            ).fetchall()
+        return [self._to_entry(r) for r in rows]
+
+    def id_range(self):
+        # (first id, last id), or (None, None) when empty; both come off the rowid index.
+        with self._lock:
+            return self._conn.execute("SELECT MIN(id), MAX(id) FROM behaviors").fetchone()
+
+    def count(self):
+        first, last = self.id_range()
+        return 0 if first is None else last - first + 1
+
+    def clear(self):
+        get_log_writer().flush()
+        with self._lock:
+            self._conn.execute("DELETE FROM behaviors")
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_behavior_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BehaviorStore()
+        return _store
+
+
+def _write_behavior_batch(entries, sync):
+    get_behavior_store().append(entries)
+
+
+get_log_writer().register("behaviors", _write_behavior_batch)
@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from config_store import get_base_dir, load_config
+
+
+DEFAULT_SUMMARY_CONFIG = {
+    "max_gap_minutes": 30,
+    "recent_per_app": 2,
+    "behavior_chars": 80,
+    "max_apps": 8,
+}
+
+
+def load_summary_config():
+    return load_config("summary_config", DEFAULT_SUMMARY_CONFIG)
+
+
+def _clip(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class BehaviorSummary:
+    # Today's activity per app, updated incrementally after every capture round:
+    # minutes in the foreground (the time since the previous round goes to the app
+    # in front at this round, so background windows get none), number of separate
+    # foreground sessions, the current uninterrupted streak and the last few distinct
+    # behaviors. It is fed to the supervisor prompt instead of the raw tail of the
+    # behavior log.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_base_dir(), "data", "cache", "behavior_summary.json")
+        self._lock = threading.Lock()
+        self._state = self._empty(datetime.now().strftime("%Y-%m-%d"))
+        self._load()
+
+    def _empty(self, day):
+        return {"day": day, "last_ts": None, "last_apps": [], "first": "", "last": "", "apps": {}}
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                obj = json.load(f) or {}
+            if isinstance(obj.get("apps"), dict):
+                self._state.update(obj)
+        except Exception:
+            pass
+
+    def save(self):
+        with self._lock:
+            data = json.loads(json.dumps(self._state))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def is_empty(self):
+        with self._lock:
+            return not self._state["apps"] or self._state["day"] != datetime.now().strftime("%Y-%m-%d")
+
+    def update(self, entries, ts=None):
+        # entries: [{"app": ..., "behavior": ..., "foreground": bool}] from one capture round.
+        cfg = load_summary_config()
+        ts = ts or time.time()
+        now = datetime.fromtimestamp(ts)
+        day = now.strftime("%Y-%m-%d")
+        max_gap = float(cfg.get("max_gap_minutes", 30))
+        keep = max(1, int(cfg.get("recent_per_app", 2)))
+        limit = int(cfg.get("behavior_chars", 80))
+        with self._lock:
+            state = self._state
+            if state["day"] != day:
+                state = self._state = self._empty(day)
+            delta = 0.0
+            continuous = False
+            if state["last_ts"] is not None:
+                gap = (ts - state["last_ts"]) / 60.0
+                if 0 <= gap <= max_gap:
+                    delta = gap
+                    continuous = True
+            seen = []
+            current = []
+            for e in entries:
+                app = str(e.get("app", "") or "").strip()
+                if not app or app in seen:
+                    continue
+                seen.append(app)
+                info = state["apps"].setdefault(app, {"minutes": 0.0, "sessions": 0, "streak": 0.0, "first": now.strftime("%H:%M"), "recent": []})
+                if e.get("foreground"):
+                    current.append(app)
+                    info["minutes"] += delta
+                    if continuous and app in state["last_apps"]:
+                        info["streak"] += delta
+                    else:
+                        info["sessions"] += 1
+                        info["streak"] = 0.0
+                info["last"] = now.strftime("%H:%M")
+                behavior = _clip(e.get("behavior", ""), limit)
+                if behavior and (not info["recent"] or info["recent"][-1] != behavior):
+                    info["recent"] = (info["recent"] + [behavior])[-keep:]
+            for app, info in state["apps"].items():
+                if app not in current:
+                    info["streak"] = 0.0
+            if seen:
+                state["first"] = state["first"] or now.strftime("%H:%M")
+                state["last"] = now.strftime("%H:%M")
+            state["last_ts"] = ts
+            state["last_apps"] = current
+
+    def rebuild(self, entries):
+        # Replays stored behavior entries (ordered by time) grouped into rounds.
+        rounds = []
+        for e in entries:
+            ts = e.get("ts")
+            if ts is None:
+                continue
+            if rounds and rounds[-1][0] == ts:
+                rounds[-1][1].append(e)
+            else:
+                rounds.append((ts, [e]))
+        for ts, group in rounds:
+            self.update(group, ts)
+
+    def text(self):
+        cfg = load_summary_config()
+        max_apps = max(1, int(cfg.get("max_apps", 8)))
+        with self._lock:
+            state = json.loads(json.dumps(self._state))
+        if state["day"] != datetime.now().strftime("%Y-%m-%d"):
+            return ""
+        apps = sorted(state["apps"].items(), key=lambda kv: kv[1]["minutes"], reverse=True)
+        if not apps:
+            return ""
+        lines = [f"统计时段：{state['day']} {state['first']}–{state['last']}"]
+        for app, info in apps[:max_apps]:
+            if info["sessions"]:
+                line = f"{app}：前台累计约 {int(round(info['minutes']))} 分钟，{info['sessions']} 段使用"
+            else:
+                line = f"{app}：仅在后台运行"
+            if app in state["last_apps"] and info["streak"] >= 1:
+                line += f"，当前已连续 {int(round(info['streak']))} 分钟"
+            if info["recent"]:
+                line += "；最近：" + "；".join(info["recent"])
+            lines.append(line)
+        if len(apps) > max_apps:
+            rest = sum(info["minutes"] for _, info in apps[max_apps:])
+            lines.append(f"其他 {len(apps) - max_apps} 个应用：共约 {int(round(rest))} 分钟")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._state = self._empty(datetime.now().strftime("%Y-%m-%d"))
+        self.save()
+
+
+_summary = None
+_summary_lock = threading.Lock()
+
+
+def get_behavior_summary():
+    global _summary
+    with _summary_lock:
+        if _summary is None:
+            _summary = BehaviorSummary()
+        return _summary
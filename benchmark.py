@@ -0,0 +1,405 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config_store import get_base_dir, get_config_store
+
+# Headless: Qt renders offscreen, so the suite runs on machines without a display.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Resolved before main() redirects the data directory to the scratch folder
+APP_DIR = get_base_dir()
+
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080), (2560, 1440)]
+ENCODE_BUDGETS = [
+    {"format": "PNG"},
+    {"format": "JPEG", "quality": 80},
+    {"format": "WEBP", "quality": 80},
+    {"format": "JPEG", "quality": 80, "max_edge": 1280},
+]
+BEHAVIOR_SIZES = [10_000, 100_000, 1_000_000]
+LOG_SIZES = [1_000, 10_000, 100_000]
+SUITES = ("encode", "payload", "behavior", "logs", "cycle")
+
+SYSTEM_PROMPT = "你是屏幕行为分析助手。根据截图，用一句中文概括用户正在使用的应用和具体在做什么，不要输出多余内容。" * 4
+APP_NAMES = ["IDEA", "Chrome", "WeChat", "bilibili", "Word", "Terminal"]
+
+
+def measure(fn, repeat=5, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return summarize(times)
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        "repeat": len(times),
+        "min_ms": ordered[0],
+        "median_ms": statistics.median(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "stdev_ms": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+class BenchmarkRun:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.results = []
+
+    def repeat(self, default):
+        return self.args.repeat or (1 if self.args.quick else default)
+
+    def record(self, name, params, stats, **extra):
+        entry = {"name": name, "params": params}
+        entry.update(stats)
+        entry.update(extra)
+        self.results.append(entry)
+        shown = ", ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<24} {shown:<44} median {stats['median_ms']:10.2f} ms   min {stats['min_ms']:10.2f} ms")
+
+
+def _synthetic_frame(width, height, pattern="blocks", seed=1):
+    from capture_backend import SyntheticCaptureBackend
+    backend = SyntheticCaptureBackend(width, height, change_rate=1.0, pattern=pattern, seed=seed)
+    handle = backend.find_windows(["bench.exe"])["bench.exe"]
+    return backend.capture(handle)
+
+
+def bench_encode(run):
+    # Raw BGRA capture buffer -> encoded bytes -> base64, as the encode stage does it.
+    import base64
+    from image_codec import encode_with_budget
+    for width, height in RESOLUTIONS:
+        capture = _synthetic_frame(width, height)
+        for budget in ENCODE_BUDGETS:
+            encoded = encode_with_budget(capture, budget)
+            params = {"resolution": f"{width}x{height}"}
+            params.update(budget)
+            stats = measure(lambda: encode_with_budget(capture, budget), run.repeat(5))
+            run.record("encode.image", params, stats, bytes=len(encoded.data), format_used=encoded.format)
+            stats = measure(lambda: base64.b64encode(encoded.data), run.repeat(20))
+            run.record("encode.base64", params, stats, bytes=len(encoded.data))
+
+
+def bench_payload(run):
+    # _build_image_part plus request body serialisation, without any network.
+    from ai_chat import AIChatClient
+    from image_codec import EncodedImage, encode_with_budget
+    client = AIChatClient(api_key="bench", base_url="http://127.0.0.1:9", model="bench", system_prompt=SYSTEM_PROMPT, use_cache=False)
+    for width, height in RESOLUTIONS:
+        encoded = encode_with_budget(_synthetic_frame(width, height), {"format": "JPEG", "quality": 80})
+
+        def build():
+            # A fresh image each time so the base64 is part of the measurement
+            image = EncodedImage(encoded.data, encoded.format, encoded.width, encoded.height)
+            payload, blobs, _, _ = client._prepare("描述用户正在做什么", None, 0.2, 256, image=image)
+            return client._encode_body(payload, blobs)
+
+        body = build()
+        params = {"resolution": f"{width}x{height}", "format": "JPEG"}
+        run.record("payload.build", params, measure(build, run.repeat(20)), bytes=len(body))
+
+
+def _behavior_entries(rng, count, start_ts):
+    entries = []
+    for i in range(count):
+        ts = start_ts + i * 30
+        entries.append({
+            "ts": ts,
+            "time": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"),
+            "app": rng.choice(APP_NAMES),
+            "behavior": "用户正在编辑 Spring AI 项目的 ChatController，并查看接口文档" + str(i % 97),
+            "image": {"format": "JPEG", "width": 1280, "height": 720, "bytes": rng.randint(40000, 200000)},
+        })
+    return entries
+
+
+def bench_behavior(run):
+    from behavior_store import BehaviorStore
+    sizes = BEHAVIOR_SIZES[:1] if run.args.quick else BEHAVIOR_SIZES
+    for size in sizes:
+        folder = os.path.join(run.workdir, f"behavior-{size}")
+        os.makedirs(folder, exist_ok=True)
+        store = BehaviorStore(path=os.path.join(folder, "behavior.db"), legacy_path=os.path.join(folder, "none.json"))
+        rng = random.Random(size)
+        start_ts = time.time() - size * 30
+        chunk = 10_000
+        started = time.perf_counter()
+        for offset in range(0, size, chunk):
+            store.append(_behavior_entries(rng, min(chunk, size - offset), start_ts + offset * 30))
+        fill_ms = (time.perf_counter() - started) * 1000
+        params = {"entries": size}
+        run.record("behavior.fill", params, summarize([fill_ms]), entries_per_s=round(size / (fill_ms / 1000)))
+        round_entries = _behavior_entries(rng, 4, time.time())
+        run.record("behavior.append_round", params, measure(lambda: store.append(round_entries), run.repeat(50)))
+        run.record("behavior.tail", params, measure(lambda: store.tail(50), run.repeat(50)))
+        day_start = time.time() - 86400
+        run.record("behavior.range_day", params, measure(lambda: store.range(start_ts=day_start), run.repeat(20)))
+        first, _ = store.id_range()
+        run.record("behavior.rows_page", params, measure(lambda: store.rows(first + rng.randrange(size) - 1, 64), run.repeat(50)))
+        run.record("behavior.count", params, measure(store.count, run.repeat(20)))
+
+
+def _write_call_log(log_dir, count, rng):
+    # Lines shaped like AIChatClient._write_log output, rotated the way the log writer
+    # does it so larger logs span compressed segments.
+    from log_store import rotate_log
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, "logs.jsonl")
+    cfg = {"rotate_mb": 8, "rotate_days": 0, "max_total_mb": 0, "compression": "gzip"}
+    start_ts = time.time() - count * 60
+    for offset in range(0, count, 1000):
+        lines = []
+        for i in range(offset, min(count, offset + 1000)):
+            lines.append(json.dumps({
+                "time": datetime.fromtimestamp(start_ts + i * 60).isoformat(timespec="seconds"),
+                "model": rng.choice(["qwen-vl-plus", "gpt-4o-mini"]),
+                "user_input_content": f"描述用户在 {rng.choice(APP_NAMES)} 中正在做什么 #{i}",
+                "system_prompt": SYSTEM_PROMPT,
+                "image": f"data/screenshot/IDEA/2026-10-18/{i:06d}.jpg",
+                "reply": "用户正在 IDEA 中调试 Spring AI 项目的接口，同时查看日志输出。" * 2,
+                "ttft_ms": rng.randint(200, 900),
+                "total_ms": rng.randint(900, 4000),
+            }, ensure_ascii=False))
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        rotate_log(cfg, log_dir=log_dir)
+
+
+def bench_logs(run):
+    # Streaming read of the whole call log, a cold index build over it, then opening it in the settings table model
+    # (first screen and the end of the first page) and full-text searches.
+    from log_index import LogIndex
+    from log_store import iter_log_entries, list_log_segments
+    from table_models import LazyTableModel, LogSearchSource
+    columns = [
+        ("时间", lambda e: str(e.get("time", ""))),
+        ("模型", lambda e: str(e.get("model", ""))),
+        ("用户输入", lambda e: str(e.get("user_input_content", "")) + "\n" + str(e.get("system_prompt", ""))),
+        ("模型回答", lambda e: str(e.get("reply", ""))),
+    ]
+    sizes = LOG_SIZES[:1] if run.args.quick else LOG_SIZES
+    for size in sizes:
+        log_dir = os.path.join(run.workdir, f"log-{size}")
+        _write_call_log(log_dir, size, random.Random(size))
+        params = {"entries": size, "segments": len(list_log_segments(log_dir))}
+        db_path = os.path.join(log_dir, "logs_index.db")
+
+        def build_index():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            index = LogIndex(path=db_path, log_dir=log_dir)
+            index.sync()
+            index._conn.close()
+
+        run.record("logs.scan", params, measure(lambda: sum(1 for _ in iter_log_entries(log_dir)), run.repeat(3)))
+        run.record("logs.index_build", params, measure(build_index, run.repeat(3), 0))
+        index = LogIndex(path=db_path, log_dir=log_dir)
+        index.sync()
+
+        def open_table():
+            source = LogSearchSource(index)
+            model = LazyTableModel(columns, source)
+            rows = model.rowCount()
+            for row in list(range(min(rows, 20))) + list(range(max(0, rows - 20), rows)):
+                for col in range(len(columns)):
+                    model.cell_text(row, col)
+
+        run.record("logs.table_open", params, measure(open_table, run.repeat(5)))
+        # What the logs page runs per search: the first page of ids plus the capped count
+        for name, text in (("logs.search", "Spring"), ("logs.search_short", "调试")):
+            run.record(name, params, measure(lambda: LogSearchSource(index, text), run.repeat(10)))
+
+
+class _FakeModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    requests = 0
+    request_bytes = 0
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        self.rfile.read(length)
+        cls = type(self)
+        cls.requests += 1
+        cls.request_bytes += length
+        if cls.latency:
+            time.sleep(cls.latency)
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": "用户正在 IDEA 中编写代码。"}}],
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_cycle(run):
+    # CaptureWorker.run end to end: synthetic windows, the real encode/analyze
+    # pipeline and a local HTTP server standing in for the model.
+    store = get_config_store()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeModelHandler)
+    _FakeModelHandler.latency = run.args.model_latency_ms / 1000.0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    apps = [{"name": name, "exe_path": f"C:/bench/{name}.exe", "status": True, "prompt": "描述用户正在做什么"} for name in APP_NAMES[:4]]
+    store.set("monitor_apps", {"apps": apps})
+    store.set("model_config", {"api_key": "bench", "base_url": base_url, "behavior_analysis": {"model": "bench-vl", "system_prompt": SYSTEM_PROMPT}})
+    store.set("cache_config", {"enabled": False})
+    store.set("metrics_config", {"enabled": True})
+    store.flush()
+
+    import main
+    from ai_chat import close_sessions
+    from capture_backend import close_capture_backend
+    from log_writer import flush_log_writer
+    from metrics import get_metrics
+    metrics = get_metrics()
+    try:
+        for batch in (False, True):
+            for change_rate in (1.0, 0.3):
+                store.set("capture_config", {
+                    "backend": "synthetic",
+                    "synthetic": {"width": 1280, "height": 720, "change_rate": change_rate, "pattern": "blocks", "seed": 7},
+                    "save_screenshots": False,
+                    "batch_analysis": batch,
+                })
+                metrics.configure()
+                metrics.reset()
+                _FakeModelHandler.requests = 0
+                _FakeModelHandler.request_bytes = 0
+                worker = main.CaptureWorker()
+                repeat = run.repeat(10)
+                stats = measure(worker.run, repeat)
+                flush_log_writer()
+                params = {"apps": len(apps), "resolution": "1280x720", "change_rate": change_rate, "batch": batch}
+                snap = metrics.snapshot()
+                run.record(
+                    "cycle.capture_worker", params, stats,
+                    model_requests=_FakeModelHandler.requests,
+                    upload_bytes=_FakeModelHandler.request_bytes,
+                    stages={name: {k: round(v, 3) for k, v in t.items() if k in ("count", "p50", "p95", "max")} for name, t in snap["timers"].items()},
+                )
+    finally:
+        close_sessions()
+        close_capture_backend()
+        server.shutdown()
+        metrics.configure({"enabled": False})
+
+
+def environment():
+    info = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+    }
+    try:
+        from PyQt5.QtCore import QT_VERSION_STR
+        info["qt"] = QT_VERSION_STR
+    except ImportError:
+        pass
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        pass
+    return info
+
+
+def _result_key(entry):
+    return entry["name"] + " " + json.dumps(entry["params"], sort_keys=True, ensure_ascii=False)
+
+
+def compare(previous_path, results):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {_result_key(e): e for e in json.load(f).get("results", [])}
+    print(f"\n对比 {previous_path}（中位数，>1 表示变慢）")
+    for entry in results:
+        old = previous.get(_result_key(entry))
+        if not old or not old.get("median_ms"):
+            continue
+        ratio = entry["median_ms"] / old["median_ms"]
+        flag = "  <-- 变慢" if ratio > 1.1 else ""
+        print(f"{_result_key(entry):<90} {old['median_ms']:10.2f} -> {entry['median_ms']:10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScreenGuardian 性能基准测试")
+    parser.add_argument("suites", nargs="*", help="要运行的测试组（" + "、".join(SUITES) + "），默认全部")
+    parser.add_argument("--quick", action="store_true", help="只跑最小规模、每项一次，用于快速检查")
+    parser.add_argument("--repeat", type=int, default=0, help="覆盖每项的重复次数")
+    parser.add_argument("--model-latency-ms", type=float, default=0, help="假模型接口的响应延迟")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 data/benchmark/bench-<时间>.json")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    args = parser.parse_args()
+    suites = args.suites or list(SUITES)
+    unknown = [name for name in suites if name not in SUITES]
+    if unknown:
+        parser.error("未知的测试组：" + "、".join(unknown))
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])  # noqa: F841 - image plugins need it
+
+    workdir = tempfile.mkdtemp(prefix="screenguardian-bench-")
+    # Every store the capture cycle touches then lives under the scratch directory,
+    # so a benchmark run never reads or writes the real data/ folder.
+    os.environ["SCREENGUARDIAN_BASE_DIR"] = workdir
+    run = BenchmarkRun(args, workdir)
+    runners = {"encode": bench_encode, "payload": bench_payload, "behavior": bench_behavior, "logs": bench_logs, "cycle": bench_cycle}
+    try:
+        for name in SUITES:
+            if name in suites:
+                print(f"== {name}")
+                runners[name](run)
+    finally:
+        if args.keep:
+            print(f"临时数据保留在 {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(APP_DIR, "data", "benchmark", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "suites": suites, "quick": args.quick, "results": run.results}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+    if args.compare:
+        compare(args.compare, run.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import abc
+import ctypes
+import json
+import random
+import threading
+import time
+from ctypes import wintypes
+from capture_pipeline import load_capture_config
+from screen_capture import (
+    CaptureResult,
+    capture_window_image,
+    find_windows_by_exe_paths,
+    release_capture_contexts,
+)
+
+
+class CaptureBackend(abc.ABC):
+    # find_windows(exe_paths) -> {exe_path: handle}, capture(handle) -> CaptureResult
+    # or None, foreground(handles) -> the handle the user is working in, or None.
+    # Handles are opaque to callers.
+    name = ""
+
+    @abc.abstractmethod
+    def find_windows(self, exe_paths):
+        ...
+
+    @abc.abstractmethod
+    def capture(self, handle):
+        ...
+
+    def foreground(self, handles):
+        return None
+
+    def close(self):
+        pass
+
+
+class Win32CaptureBackend(CaptureBackend):
+    name = "win32"
+
+    def find_windows(self, exe_paths):
+        return find_windows_by_exe_paths(exe_paths)
+
+    def capture(self, handle):
+        return capture_window_image(handle)
+
+    def foreground(self, handles):
+        user32 = ctypes.windll.user32
+        active = user32.GetForegroundWindow()
+        if not active:
+            return None
+        handles = [h for h in handles if h]
+        if active in handles:
+            return active
+        # A dialog or second window of a monitored program still counts as that program
+        pid = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(active, ctypes.byref(pid))
+        for handle in handles:
+            owner = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(handle, ctypes.byref(owner))
+            if owner.value == pid.value:
+                return handle
+        return None
+
+    def close(self):
+        release_capture_contexts()
+
+
+DEFAULT_SYNTHETIC_CONFIG = {
+    "width": 1280,
+    "height": 720,
+    "change_rate": 0.3,
+    "pattern": "blocks",
+    "seed": 0,
+    "latency_ms": 0,
+}
+
+SYNTHETIC_PATTERNS = ("solid", "gradient", "blocks", "noise")
+
+
+class SyntheticCaptureBackend(CaptureBackend):
+    # Generated frames for running the capture/analyze path without real windows.
+    # Each exe path gets a fake window; on every capture its content changes with
+    # probability change_rate, otherwise the previous frame is returned unchanged.
+    name = "synthetic"
+
+    def __init__(self, width=1280, height=720, change_rate=0.3, pattern="blocks", seed=0, latency_ms=0):
+        self.width = max(1, int(width))
+        self.height = max(1, int(height))
+        self.change_rate = min(1.0, max(0.0, float(change_rate)))
+        self.pattern = pattern if pattern in SYNTHETIC_PATTERNS else "blocks"
+        self.seed = int(seed)
+        self.latency = max(0.0, float(latency_ms)) / 1000.0
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._windows = {}
+        self.stats = {"captures": 0, "changes": 0}
+
+    @classmethod
+    def from_config(cls, cfg):
+        settings = dict(DEFAULT_SYNTHETIC_CONFIG)
+        settings.update(cfg or {})
+        return cls(**{k: settings[k] for k in DEFAULT_SYNTHETIC_CONFIG})
+
+    def find_windows(self, exe_paths):
+        result = {}
+        with self._lock:
+            for exe_path in exe_paths:
+                if not exe_path:
+                    continue
+                handle = self._handles.get(exe_path)
+                if handle is None:
+                    handle = 0x10000 + len(self._handles) * 4
+                    self._handles[exe_path] = handle
+                    self._windows[handle] = {
+                        "exe_path": exe_path,
+                        "rng": random.Random(self.seed * 1000003 + handle),
+                        "version": -1,
+                        "frame": None,
+                    }
+                result[exe_path] = handle
+        return result
+
+    def capture(self, handle):
+        with self._lock:
+            window = self._windows.get(handle)
+        if window is None:
+            return None
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["captures"] += 1
+            rng = window["rng"]
+            if window["frame"] is None or rng.random() < self.change_rate:
+                window["version"] += 1
+                window["frame"] = self._render(rng, window["version"])
+                self.stats["changes"] += 1
+            frame = window["frame"]
+        return CaptureResult(frame, self.width, self.height, self.width * 4, hwnd=handle)
+
+    def _render(self, rng, version):
+        w, h = self.width, self.height
+        if self.pattern == "noise":
+            return rng.randbytes(w * h * 4)
+        if self.pattern == "solid":
+            return bytes((version * 37 % 256, version * 71 % 256, version * 113 % 256, 255)) * (w * h)
+        shift = version * 24
+        row = bytes(b for x in range(w) for b in (x * 255 // w, (x + shift) % 256, 160, 255))
+        if self.pattern == "gradient":
+            return row * h
+        frame = bytearray(row * h)
+        # A few flat rectangles at random positions, so consecutive versions differ
+        # in structure and not just in colour.
+        stride = w * 4
+        for _ in range(3):
+            bw = rng.randint(max(1, w // 8), max(1, w // 3))
+            bh = rng.randint(max(1, h // 8), max(1, h // 3))
+            x0 = rng.randint(0, w - bw)
+            y0 = rng.randint(0, h - bh)
+            fill = bytes((rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)) * bw
+            for y in range(y0, y0 + bh):
+                start = y * stride + x0 * 4
+                frame[start:start + bw * 4] = fill
+        return bytes(frame)
+
+
+_backend = None
+_backend_key = None
+_backend_lock = threading.Lock()
+
+
+def get_capture_backend(cfg=None):
+    # Selected by capture_config.json "backend" ("win32" or "synthetic"), with the
+    # synthetic frame settings under "synthetic". The instance is kept across capture
+    # rounds so synthetic windows keep their frame history.
+    global _backend, _backend_key
+    if cfg is None:
+        cfg = load_capture_config()
+    name = str(cfg.get("backend", "win32") or "win32").lower()
+    settings = cfg.get("synthetic") if name == "synthetic" else None
+    key = (name, json.dumps(settings, sort_keys=True))
+    with _backend_lock:
+        if _backend is not None and _backend_key == key:
+            return _backend
+        if _backend is not None:
+            _backend.close()
+        if name == "synthetic":
+            _backend = SyntheticCaptureBackend.from_config(settings)
+        else:
+            _backend = Win32CaptureBackend()
+        _backend_key = key
+        return _backend
+
+
+def close_capture_backend():
+    global _backend, _backend_key
+    with _backend_lock:
+        backend, _backend, _backend_key = _backend, None, None
+    if backend is not None:
+        backend.close()
+    release_capture_contexts()
@@ -0,0 +1,98 @@
+import queue
+import threading
+from config_store import load_config
+
+
+DEFAULT_CAPTURE_CONFIG = {
+    "queue_size": 2,
+    "capture_concurrency": 2,
+    # Model requests in flight at once during a capture round
+    "analyze_concurrency": 4,
+    "save_screenshots": True,
+    "backend": "win32",
+    "batch_analysis": False,
+    "batch_max_images": 6,
+}
+
+
+def load_capture_config():
+    return load_config("capture_config", DEFAULT_CAPTURE_CONFIG)
+
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+class CapturePipeline:
+    # Stages run in their own threads and are joined by bounded queues, so a slow
+    # stage blocks the ones before it instead of letting items pile up in memory.
+    def __init__(self, stages, queue_size=2):
+        self.stages = list(stages)
+        self.queue_size = max(1, int(queue_size))
+
+    def run(self, items):
+        items = list(items)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue())
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            next_workers = self.stages[idx + 1].workers if idx + 1 < len(self.stages) else 1
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[idx], queues[idx + 1], remaining, lock, next_workers),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        feeder = threading.Thread(target=self._feed, args=(items, queues[0], self.stages[0].workers), daemon=True)
+        feeder.start()
+
+        results = [None] * len(items)
+        out = queues[-1]
+        while True:
+            entry = out.get()
+            if entry is _STOP:
+                break
+            index, value = entry
+            results[index] = value
+        feeder.join()
+        for t in threads:
+            t.join()
+        return results
+
+    def _feed(self, items, q, workers):
+        for index, item in enumerate(items):
+            q.put((index, item))
+        for _ in range(workers):
+            q.put(_STOP)
+
+    def _worker(self, stage, q_in, q_out, remaining, lock, next_workers):
+        while True:
+            entry = q_in.get()
+            if entry is _STOP:
+                break
+            index, item = entry
+            try:
+                value = stage.func(item)
+            except Exception as e:
+                print(f"[{stage.name}] {e}")
+                value = None
+            if value is not None:
+                q_out.put((index, value))
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(next_workers):
+                q_out.put(_STOP)
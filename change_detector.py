@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from config_store import get_base_dir
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ChangeDetector:
+    # Remembers the perceptual hash and behavior of the last analysed frame per app,
+    # so near-identical screenshots can reuse that behavior instead of a model call.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_base_dir(), "data", "cache", "change_detect.json")
+        self._lock = threading.Lock()
+        self._apps = {}
+        self._stats = {"analysed": 0, "skipped": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                obj = json.load(f) or {}
+            self._apps = obj.get("apps", {}) or {}
+            self._stats.update(obj.get("stats", {}) or {})
+        except Exception:
+            pass
+
+    def save(self):
+        with self._lock:
+            data = {"apps": dict(self._apps), "stats": dict(self._stats)}
+        # Temp file + rename, so a crash mid-write never leaves a truncated file behind
+        tmp = None
+        try:
+            folder = os.path.dirname(self.path)
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".change_detect.", suffix=".tmp", dir=folder)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(str(e))
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def check(self, app, frame_hash, threshold, prompt="", model="", system_prompt=""):
+        # Returns (previous entry, distance) when the frame is close enough to reuse.
+        # A behavior is only reused for the same model, system prompt and app prompt.
+        with self._lock:
+            prev = self._apps.get(app)
+        if not prev or not prev.get("behavior"):
+            return None, None
+        if (prev.get("prompt", ""), prev.get("model", ""), prev.get("system_prompt", "")) != (prompt, model, system_prompt):
+            return None, None
+        try:
+            prev_hash = int(prev.get("hash", ""), 16)
+        except ValueError:
+            return None, None
+        distance = hamming_distance(prev_hash, frame_hash)
+        if distance > threshold:
+            return None, distance
+        return prev, distance
+
+    def record_analysed(self, app, frame_hash, behavior, prompt="", model="", system_prompt=""):
+        with self._lock:
+            self._apps[app] = {
+                "hash": format(frame_hash, "x"),
+                "behavior": behavior,
+                "prompt": prompt,
+                "model": model,
+                "system_prompt": system_prompt,
+                "time": time.time(),
+            }
+            self._stats["analysed"] += 1
+
+    def record_skipped(self, app):
+        with self._lock:
+            prev = self._apps.get(app)
+            if prev:
+                prev["time"] = time.time()
+            self._stats["skipped"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_change_detector():
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = ChangeDetector()
+        return _detector
@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from config_store import get_base_dir, load_config
+
+
+DEFAULT_CHAT_CONFIG = {
+    "memory_enabled": True,
+    "history_tokens": 1500,
+    "summary_tokens": 400,
+    "max_turn_tokens": 600,
+}
+
+SUMMARY_PROMPT = (
+    "你负责压缩桌宠与用户的聊天记录。把已有摘要和新的对话合并成一段简洁的中文摘要，"
+    "保留用户的偏好、事实、约定和未完成的话题，省略寒暄。只输出摘要本身。"
+)
+
+
+def load_chat_config():
+    return load_config("chat_config", DEFAULT_CHAT_CONFIG)
+
+
+def estimate_tokens(text):
+    # Close enough for budgeting without a tokenizer: CJK characters are roughly one
+    # token each, other text roughly four characters per token.
+    text = text or ""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def clip_tokens(text, budget):
+    text = text or ""
+    if estimate_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…"
+
+
+class ChatMemory:
+    # Recent turns kept verbatim within history_tokens, everything older folded into a
+    # running summary of at most summary_tokens, so the history sent with each chat
+    # request stays bounded however long the conversation gets. Persisted as JSON.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_base_dir(), "data", "chat", "memory.json")
+        self._lock = threading.Lock()
+        self._compacting = False
+        self.summary = ""
+        self.turns = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                obj = json.load(f) or {}
+        except Exception:
+            return
+        self.summary = str(obj.get("summary", "") or "")
+        self.turns = [t for t in obj.get("turns", []) if isinstance(t, dict) and t.get("role") and "content" in t]
+
+    def _save_locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".memory.", suffix=".tmp", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"summary": self.summary, "turns": self.turns}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(str(e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def messages(self):
+        # Chat-completion messages to place between the system prompt and the new message.
+        with self._lock:
+            out = []
+            if self.summary:
+                out.append({"role": "system", "content": "此前对话的摘要：" + self.summary})
+            out.extend({"role": t["role"], "content": t["content"]} for t in self.turns)
+            return out
+
+    def add_turn(self, user_text, reply):
+        cfg = load_chat_config()
+        limit = int(cfg.get("max_turn_tokens", 600))
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self.turns.append({"role": "user", "content": clip_tokens(user_text, limit), "time": now})
+            self.turns.append({"role": "assistant", "content": clip_tokens(reply, limit), "time": now})
+            self._save_locked()
+
+    def _take_overflow_locked(self, budget):
+        # Oldest whole user/assistant pairs that must leave the verbatim window. Trims
+        # down to 60% of the budget so compaction does not run on every message.
+        total = sum(estimate_tokens(t["content"]) for t in self.turns)
+        if total <= budget:
+            return []
+        target = budget * 0.6
+        count = 0
+        while count < len(self.turns) - 2 and total > target:
+            total -= estimate_tokens(self.turns[count]["content"])
+            count += 1
+        if count % 2:
+            count += 1
+        return self.turns[:count]
+
+    async def compact(self, summarize):
+        # summarize(previous_summary, turns) is a coroutine returning the new summary.
+        # When it fails the overflow is still dropped, with a plain extract folded
+        # into the summary instead, so the budget always holds.
+        cfg = load_chat_config()
+        budget = int(cfg.get("history_tokens", 1500))
+        summary_budget = int(cfg.get("summary_tokens", 400))
+        with self._lock:
+            if self._compacting:
+                return False
+            overflow = self._take_overflow_locked(budget)
+            if not overflow:
+                return False
+            self._compacting = True
+            previous = self.summary
+        try:
+            try:
+                summary = (await summarize(previous, overflow) or "").strip()
+            except Exception as e:
+                print(str(e))
+                summary = ""
+            if not summary:
+                lines = [previous] if previous else []
+                lines += [f"{'用户' if t['role'] == 'user' else '我'}：{clip_tokens(t['content'], 40)}" for t in overflow]
+                summary = "\n".join(lines)
+                # Keep the newest part of the extract
+                while estimate_tokens(summary) > summary_budget and "\n" in summary:
+                    summary = summary.split("\n", 1)[1]
+            with self._lock:
+                if self.turns[:len(overflow)] != overflow:
+                    # Cleared while the summary was being written
+                    return False
+                self.turns = self.turns[len(overflow):]
+                self.summary = clip_tokens(summary, summary_budget)
+                self._save_locked()
+            return True
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self._save_locked()
+
+
+def format_turns(turns):
+    return "\n".join(f"{'用户' if t['role'] == 'user' else '桌宠'}：{t['content']}" for t in turns)
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_chat_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = ChatMemory()
+        return _memory
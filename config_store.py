@@ -0,0 +1,182 @@
+import copy
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def get_base_dir():
+    # SCREENGUARDIAN_BASE_DIR moves the data/ tree elsewhere, e.g. to scratch data
+    # for the benchmark.
+    override = os.environ.get("SCREENGUARDIAN_BASE_DIR")
+    if override:
+        return os.path.abspath(override)
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+class ConfigStore:
+    # Parsed data/config/<name>.json files cached in memory. A cached file is
+    # revalidated with one stat() at most every check_interval seconds and re-parsed
+    # only when its mtime/size changed; listeners are called with the name on every
+    # reload. Writes update the cache at once and reach disk after write_delay, so a
+    # burst of changes (slider drags, typing) becomes one atomic temp-file + rename.
+    def __init__(self, config_dir=None, check_interval=1.0, write_delay=0.5):
+        self.config_dir = config_dir or os.path.join(get_base_dir(), "data", "config")
+        self.check_interval = check_interval
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._pending = {}
+        self._timer = None
+        self._listeners = []
+
+    def path(self, name):
+        return os.path.join(self.config_dir, f"{name}.json")
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _stat(self, name):
+        try:
+            st = os.stat(self.path(name))
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _read(self, name):
+        try:
+            with open(self.path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(str(e))
+            return None
+
+    def _load(self, name, force=False):
+        # Returns (data, reloaded). Must be called with the lock held.
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and (name in self._pending or (not force and now - entry["checked"] < self.check_interval)):
+            return entry["data"], False
+        sig = self._stat(name)
+        if entry is not None and entry["sig"] == sig:
+            entry["checked"] = now
+            return entry["data"], False
+        data = self._read(name) if sig is not None else None
+        if entry is not None and sig is not None and data is None:
+            # Caught mid-write by another program or hand-edited into invalid JSON:
+            # keep serving the last good copy until the file changes again.
+            entry["sig"] = sig
+            entry["checked"] = now
+            return entry["data"], False
+        self._entries[name] = {"data": data, "sig": sig, "checked": now}
+        return data, entry is not None
+
+    def get(self, name, defaults=None):
+        # A private copy: defaults overlaid with the file contents when both are dicts.
+        with self._lock:
+            data, reloaded = self._load(name)
+            data = copy.deepcopy(data)
+        if reloaded:
+            self._notify(name)
+        if isinstance(defaults, dict):
+            merged = copy.deepcopy(defaults)
+            if isinstance(data, dict):
+                merged.update(data)
+            return merged
+        return data if data is not None else copy.deepcopy(defaults)
+
+    def set(self, name, data):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = {"data": None, "sig": None, "checked": time.monotonic()}
+            entry["data"] = copy.deepcopy(data)
+            self._pending[name] = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def update(self, name, changes):
+        with self._lock:
+            data, _ = self._load(name)
+            data = copy.deepcopy(data) if isinstance(data, dict) else {}
+            data.update(changes)
+            self.set(name, data)
+            return data
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            names = list(self._pending)
+            self._pending.clear()
+            for name in names:
+                entry = self._entries[name]
+                try:
+                    self._write_atomic(name, entry["data"])
+                    entry["sig"] = self._stat(name)
+                except Exception as e:
+                    print(str(e))
+                entry["checked"] = time.monotonic()
+
+    def _write_atomic(self, name, data):
+        os.makedirs(self.config_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=self.config_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path(name))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def poll(self):
+        # Revalidates every cached config now; used by a UI timer for hot reload.
+        reloaded = []
+        with self._lock:
+            for name in list(self._entries):
+                if self._load(name, force=True)[1]:
+                    reloaded.append(name)
+        for name in reloaded:
+            self._notify(name)
+        return reloaded
+
+    def _notify(self, name):
+        for callback in list(self._listeners):
+            try:
+                callback(name)
+            except Exception as e:
+                print(str(e))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+        return _store
+
+
+def load_config(name, defaults=None):
+    return get_config_store().get(name, defaults)
+
+
+def flush_config_store():
+    get_config_store().flush()
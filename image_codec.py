@@ -0,0 +1,144 @@
+import base64
+import hashlib
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt5.QtGui import QImage
+
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "JPG": "image/jpeg",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+DEFAULT_IMAGE_BUDGET = {
+    "max_edge": 1600,
+    "max_pixels": 1600 * 1000,
+    "format": "JPEG",
+    "quality": 80,
+}
+
+
+def resolve_image_budget(capture_cfg, model=None, app_name=None):
+    # default < per-model < per-app, each level only overriding the keys it sets.
+    budgets = (capture_cfg or {}).get("image_budget", {}) or {}
+    budget = dict(DEFAULT_IMAGE_BUDGET)
+    budget.update(budgets.get("default", {}) or {})
+    if model:
+        budget.update((budgets.get("models", {}) or {}).get(model, {}) or {})
+    if app_name:
+        budget.update((budgets.get("apps", {}) or {}).get(app_name, {}) or {})
+    return budget
+
+
+def fit_size(width, height, max_edge=0, max_pixels=0):
+    scale = 1.0
+    if max_edge and max(width, height) > max_edge:
+        scale = min(scale, max_edge / max(width, height))
+    if max_pixels and width * height > max_pixels:
+        scale = min(scale, (max_pixels / (width * height)) ** 0.5)
+    if scale >= 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class EncodedImage:
+    # Encoded screenshot bytes ready to be placed into a request payload.
+    def __init__(self, data: bytes, fmt: str, width: int, height: int, label=None, quality=-1, source_size=None):
+        self.data = data
+        self.format = fmt.upper()
+        self.width = width
+        self.height = height
+        self.label = label
+        self.quality = quality
+        self.source_size = source_size or (width, height)
+        self._b64 = None
+        self._digest = None
+
+    @property
+    def mime(self):
+        return MIME_TYPES.get(self.format, "image/png")
+
+    @property
+    def extension(self):
+        return "jpg" if self.format in ("JPG", "JPEG") else self.format.lower()
+
+    @property
+    def b64(self) -> bytes:
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.data)
+        return self._b64
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    def describe(self):
+        return {
+            "format": self.format,
+            "quality": self.quality,
+            "width": self.width,
+            "height": self.height,
+            "source_width": self.source_size[0],
+            "source_height": self.source_size[1],
+            "bytes": len(self.data),
+        }
+
+
+def dhash(capture, size=8):
+    # Difference hash: compares neighbouring pixels of a tiny grayscale thumbnail.
+    image = capture.to_qimage().scaled(size + 1, size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    image = image.convertToFormat(QImage.Format_Grayscale8)
+    stride = image.bytesPerLine()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    pixels = bytes(bits)
+    value = 0
+    for y in range(size):
+        row = y * stride
+        for x in range(size):
+            value = (value << 1) | (pixels[row + x] > pixels[row + x + 1])
+    return value
+
+
+def encode_qimage(image, fmt="PNG", quality=-1):
+    ba = QByteArray()
+    buf = QBuffer(ba)
+    buf.open(QIODevice.WriteOnly)
+    ok = image.save(buf, fmt, quality)
+    buf.close()
+    if not ok:
+        return None
+    return ba.data()
+
+
+def encode_capture(capture, fmt="PNG", quality=-1, max_edge=0, max_pixels=0):
+    image = capture.to_qimage()
+    source_size = (image.width(), image.height())
+    width, height = fit_size(source_size[0], source_size[1], max_edge, max_pixels)
+    if (width, height) != source_size:
+        image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    fmt = fmt.upper()
+    if fmt != "PNG":
+        # PrintWindow leaves the alpha channel undefined; lossy codecs should ignore it.
+        image = image.convertToFormat(QImage.Format_RGB32)
+    data = encode_qimage(image, fmt, quality)
+    if data is None and fmt != "PNG":
+        # The WebP/JPEG image plugin may be missing from the Qt build.
+        fmt, quality = "PNG", -1
+        data = encode_qimage(image, fmt, quality)
+    if data is None:
+        return None
+    return EncodedImage(data, fmt, width, height, quality=quality, source_size=source_size)
+
+
+def encode_with_budget(capture, budget):
+    return encode_capture(
+        capture,
+        fmt=str(budget.get("format", "PNG")),
+        quality=int(budget.get("quality", -1)),
+        max_edge=int(budget.get("max_edge", 0) or 0),
+        max_pixels=int(budget.get("max_pixels", 0) or 0),
+    )
@@ -0,0 +1,348 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from log_store import INDEX_NAME, LIVE_SEGMENT, get_log_dir, iter_segment_lines, list_log_segments, segment_path
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _short_terms(text):
+    # Every one- and two-character substring of each word, lowercased and deduplicated:
+    # what the calls_short table indexes so one- and two-character searches (most
+    # Chinese words) are token lookups rather than scans.
+    terms = set()
+    for word in _WORD_RE.findall(str(text or "").lower()):
+        terms.update(word)
+        terms.update(map(str.__add__, word, word[1:]))
+    return " ".join(terms)
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _parse_time(text):
+    try:
+        return datetime.fromisoformat(str(text)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class LogIndex:
+    # SQLite index over the call log (closed segments plus the live logs.jsonl) with an
+    # FTS5 trigram table on user input and reply for terms of three or more characters
+    # and a table of one- and two-character terms for shorter ones. Rows only hold what
+    # the table filters and sorts on plus the entry's segment and offset; the entry
+    # itself is read from the log.
+    # sync() only reads the bytes appended since the last call; when the live file has
+    # been rotated its rows are relabelled to the new segment instead of re-read.
+    # generation goes up whenever rows are added or removed, so views can poll it
+    # without touching the database.
+    def __init__(self, path=None, log_dir=None):
+        self.log_dir = log_dir or get_log_dir()
+        self.path = path or os.path.join(self.log_dir, INDEX_NAME)
+        self.log_path = segment_path(LIVE_SEGMENT, self.log_dir)
+        self._lock = threading.Lock()
+        self._pruned = False
+        self._removed = False
+        self.generation = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA journal_size_limit=4194304")
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(calls)")]
+        if "system_prompt" in columns:
+            # Older indexes kept a full copy of every entry; rebuild from the log.
+            self._conn.execute("DROP TABLE IF EXISTS calls_fts")
+            self._conn.execute("DROP TABLE calls")
+            self._conn.execute("DROP TABLE IF EXISTS meta")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, time TEXT, model TEXT, "
+            "cached INTEGER NOT NULL DEFAULT 0, segment TEXT NOT NULL DEFAULT '', offset INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_segment ON calls(segment)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_ts ON calls(ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_model_ts ON calls(model, ts)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        has_short = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'calls_short'").fetchone()
+        self.fts = self._create_fts()
+        # Contentless, without positions or sizes: only single-term lookups are needed.
+        # Deleting a row needs its terms again, rebuilt from calls_fts (see _delete_locked).
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS calls_short USING fts5(terms, content='', detail=none, columnsize=0)"
+        )
+        if not has_short and self._conn.execute("SELECT 1 FROM calls LIMIT 1").fetchone():
+            # Indexed before short terms existed; the next sync rebuilds from the log.
+            self._clear_locked()
+        self._conn.commit()
+        # Queries from the views use a connection of their own: under WAL they read the
+        # last committed state and never wait for a sync or VACUUM in progress.
+        self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        self._read_lock = threading.Lock()
+
+    def _create_fts(self):
+        # The trigram tokenizer gives substring matches for CJK text (SQLite >= 3.34);
+        # without it, searches fall back to LIKE scans.
+        for tokenize in ("trigram", None):
+            try:
+                options = f", tokenize='{tokenize}'" if tokenize else ""
+                self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS calls_fts USING fts5(user_input, reply{options})")
+                row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'calls_fts'").fetchone()
+                return bool(row) and "trigram" in row[0]
+            except sqlite3.OperationalError:
+                continue
+        return False
+
+    def _get_meta(self, name, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, str(value)))
+
+    def sync(self):
+        with self._lock:
+            added = self._sync_segments_locked()
+            offset = int(self._get_meta("log_offset", 0))
+            try:
+                size = os.path.getsize(self.log_path)
+            except OSError:
+                size = 0
+            if size < offset:
+                # The live log was cleared or replaced; re-read it from the start.
+                self._delete_locked("segment = ?", (LIVE_SEGMENT,))
+                offset = 0
+            if size > offset:
+                with open(self.log_path, "rb") as f:
+                    f.seek(offset)
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break
+                        line_offset = offset
+                        offset += len(raw)
+                        try:
+                            e = json.loads(raw)
+                        except Exception:
+                            continue
+                        self._insert(e, line_offset)
+                        added += 1
+            self._set_meta("log_offset", offset)
+            self._conn.commit()
+            if added or self._removed:
+                self._removed = False
+                self.generation += 1
+            if self._pruned:
+                # Hand the pruned rows' pages back so the file stays within the log cap
+                self._pruned = False
+                self._conn.execute("VACUUM")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return added
+
+    def _sync_segments_locked(self):
+        segments = list_log_segments(self.log_dir)
+        try:
+            indexed = json.loads(self._get_meta("segments", "[]"))
+        except ValueError:
+            indexed = []
+        for name in indexed:
+            if name not in segments:
+                # Dropped by the size cap
+                self._delete_locked("segment = ?", (name,))
+                self._pruned = True
+        added = 0
+        for name in segments:
+            if name in indexed:
+                continue
+            start = 0
+            if self._conn.execute("SELECT 1 FROM calls WHERE segment = ? LIMIT 1", (LIVE_SEGMENT,)).fetchone():
+                # The live file was rotated into this segment; keep its rows and only
+                # read what was appended after the last sync.
+                self._conn.execute("UPDATE calls SET segment = ? WHERE segment = ?", (name, LIVE_SEGMENT))
+                start = int(self._get_meta("log_offset", 0))
+            self._set_meta("log_offset", 0)
+            try:
+                for line_offset, raw in iter_segment_lines(name, start, self.log_dir):
+                    try:
+                        e = json.loads(raw)
+                    except Exception:
+                        continue
+                    self._insert(e, line_offset, name)
+                    added += 1
+            except Exception as e:
+                print(str(e))
+        self._set_meta("segments", json.dumps(segments))
+        return added
+
+    def _insert(self, e, offset, segment=LIVE_SEGMENT):
+        cur = self._conn.execute(
+            "INSERT INTO calls (ts, time, model, cached, offset, segment) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                _parse_time(e.get("time", "")),
+                str(e.get("time", "")),
+                str(e.get("model", "")),
+                1 if e.get("cached") else 0,
+                offset,
+                segment,
+            ),
+        )
+        self._conn.execute(
+            "INSERT INTO calls_fts (rowid, user_input, reply) VALUES (?, ?, ?)",
+            (cur.lastrowid, str(e.get("user_input_content", "")), str(e.get("reply", ""))),
+        )
+        self._conn.execute(
+            "INSERT INTO calls_short (rowid, terms) VALUES (?, ?)",
+            (cur.lastrowid, _short_terms(str(e.get("user_input_content", "")) + "\n" + str(e.get("reply", "")))),
+        )
+
+    def _query(self, select, text="", model=None, start_ts=None, end_ts=None, after_id=None):
+        # FROM/WHERE for a search. When there are search terms an FTS table drives the
+        # query in rowid order, so LIMIT stops after one page instead of collecting
+        # every match first.
+        long_terms = []
+        short_terms = []
+        like_terms = []
+        for term in (text or "").lower().split():
+            for word in _WORD_RE.findall(term):
+                if len(word) <= 2:
+                    short_terms.append(word)
+                elif self.fts:
+                    long_terms.append(word)
+                else:
+                    like_terms.append(word)
+        tables = []
+        clauses = []
+        params = []
+        if long_terms:
+            tables.append("calls_fts")
+            clauses.append("calls_fts MATCH ?")
+            params.append(" AND ".join(_fts_phrase(t) for t in long_terms))
+        if short_terms:
+            tables.append("calls_short")
+            clauses.append("calls_short MATCH ?")
+            params.append(" AND ".join(_fts_phrase(t) for t in short_terms))
+        if like_terms:
+            # Only without the trigram tokenizer (SQLite < 3.34)
+            if "calls_fts" not in tables:
+                tables.append("calls_fts")
+            for t in like_terms:
+                clauses.append("(calls_fts.user_input LIKE ? OR calls_fts.reply LIKE ?)")
+                params.extend([f"%{t}%", f"%{t}%"])
+        rowid = f"{tables[0]}.rowid" if tables else "calls.id"
+        # CROSS JOIN keeps the first FTS table as the outer loop; left to itself the
+        # planner may walk calls by model or time and evaluate MATCH row by row.
+        joins = "".join(f" CROSS JOIN {t} ON {t}.rowid = {rowid}" for t in tables[1:])
+        source = f"{tables[0]}{joins} CROSS JOIN calls ON calls.id = {rowid}" if tables else "calls"
+        if model:
+            clauses.append("calls.model = ?")
+            params.append(model)
+        if start_ts is not None:
+            clauses.append("calls.ts >= ?")
+            params.append(start_ts)
+        if end_ts is not None:
+            clauses.append("calls.ts < ?")
+            params.append(end_ts)
+        if after_id is not None:
+            clauses.append(f"{rowid} > ?")
+            params.append(after_id)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return f"SELECT {select.format(rowid=rowid)} FROM {source}{where}", rowid, params
+
+    def search_ids(self, text="", model=None, start_ts=None, end_ts=None, after_id=None, limit=None):
+        # Ids of matches in log order after after_id; at most limit of them.
+        sql, rowid, params = self._query("{rowid}", text, model, start_ts, end_ts, after_id)
+        sql += f" ORDER BY {rowid}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._read_lock:
+            return [r[0] for r in self._reader.execute(sql, params)]
+
+    def count_matches(self, text="", model=None, start_ts=None, end_ts=None, cap=None):
+        # Number of matches, counting no further than cap.
+        sql, _, params = self._query("1", text, model, start_ts, end_ts)
+        if cap is not None:
+            sql += " LIMIT ?"
+            params.append(int(cap))
+        with self._read_lock:
+            return self._reader.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def locations(self, ids):
+        # Current (segment, offset) of each id; rows removed since come back as None.
+        found = {}
+        ids = list(ids)
+        with self._read_lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for row_id, segment, offset in self._reader.execute(
+                    f"SELECT id, segment, offset FROM calls WHERE id IN ({marks})", chunk
+                ):
+                    found[row_id] = (segment, offset)
+        return [found.get(i) for i in ids]
+
+    def models(self):
+        with self._read_lock:
+            rows = self._reader.execute("SELECT DISTINCT model FROM calls ORDER BY model").fetchall()
+        return [r[0] for r in rows if r[0]]
+
+    def _delete_locked(self, where, params):
+        self._conn.executemany(
+            "INSERT INTO calls_short (calls_short, rowid, terms) VALUES ('delete', ?, ?)",
+            [
+                (row_id, _short_terms(user_input + "\n" + reply))
+                for row_id, user_input, reply in self._conn.execute(
+                    f"SELECT rowid, user_input, reply FROM calls_fts WHERE rowid IN (SELECT id FROM calls WHERE {where})",
+                    params,
+                ).fetchall()
+            ],
+        )
+        self._conn.execute(f"DELETE FROM calls_fts WHERE rowid IN (SELECT id FROM calls WHERE {where})", params)
+        self._conn.execute(f"DELETE FROM calls WHERE {where}", params)
+        self._removed = True
+
+    def _clear_locked(self):
+        self._conn.execute("DELETE FROM calls")
+        self._conn.execute("DELETE FROM calls_fts")
+        self._conn.execute("INSERT INTO calls_short (calls_short) VALUES ('delete-all')")
+        self._set_meta("log_offset", 0)
+        self._set_meta("segments", "[]")
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+            self._conn.commit()
+            self.generation += 1
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_log_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LogIndex()
+        return _index
+
+
+def start_log_index_sync():
+    # Catches the index up with the log on a background thread at startup (on an
+    # upgraded install that is the whole existing log); afterwards the log writer
+    # keeps it in sync and views follow LogIndex.generation.
+    def run():
+        try:
+            get_log_index().sync()
+        except Exception as e:
+            print(str(e))
+
+    thread = threading.Thread(target=run, name="log-index-sync", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,274 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from config_store import get_base_dir, load_config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def get_log_dir():
+    return os.path.join(get_base_dir(), "data", "log")
+
+
+DEFAULT_LOG_CONFIG = {
+    "rotate_mb": 8,
+    "rotate_days": 7,
+    "max_total_mb": 256,
+    "compression": "gzip",
+}
+
+# The live logs.jsonl, as named in segment columns; closed segments use their file name.
+LIVE_SEGMENT = ""
+# The search index kept next to the segments; it counts toward max_total_mb.
+INDEX_NAME = "logs_index.db"
+
+_SEGMENT_RE = re.compile(r"^logs-(\d{8}-\d{6})(?:-(\d+))?\.jsonl(\.gz|\.zst)?$")
+_MB = 1024 * 1024
+
+
+def load_log_config():
+    return load_config("log_config", DEFAULT_LOG_CONFIG)
+
+
+def list_log_segments(log_dir=None):
+    # Closed segments, oldest first. A plain segment left next to its compressed copy
+    # by an interrupted rotation is skipped.
+    log_dir = log_dir or get_log_dir()
+    try:
+        names = [n for n in os.listdir(log_dir) if _SEGMENT_RE.match(n)]
+    except OSError:
+        return []
+    present = set(names)
+    names = [n for n in names if not (n.endswith(".jsonl") and (n + ".gz" in present or n + ".zst" in present))]
+    return sorted(names, key=_segment_order)
+
+
+def _segment_order(name):
+    m = _SEGMENT_RE.match(name)
+    return (m.group(1), int(m.group(2) or 0))
+
+
+def segment_path(name, log_dir=None):
+    log_dir = log_dir or get_log_dir()
+    return os.path.join(log_dir, name) if name else os.path.join(log_dir, "logs.jsonl")
+
+
+def open_segment(name, log_dir=None):
+    path = segment_path(name, log_dir)
+    if name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"读取 {name} 需要安装 zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def iter_segment_lines(name, start=0, log_dir=None):
+    # (offset, raw line) for every complete line from the uncompressed offset start.
+    with open_segment(name, log_dir) as f:
+        skip = start
+        while skip > 0:
+            chunk = f.read(min(skip, _MB))
+            if not chunk:
+                return
+            skip -= len(chunk)
+        offset = start
+        pending = b""
+        while True:
+            chunk = f.read(_MB)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for raw in lines:
+                if raw:
+                    yield offset, raw
+                offset += len(raw) + 1
+
+
+def iter_log_entries(log_dir=None):
+    # Every entry in log order, streamed across the closed segments and the live file.
+    for name in list_log_segments(log_dir) + [LIVE_SEGMENT]:
+        try:
+            for _, raw in iter_segment_lines(name, 0, log_dir):
+                try:
+                    yield json.loads(raw)
+                except Exception:
+                    continue
+        except FileNotFoundError:
+            continue
+
+
+_segment_cache = OrderedDict()
+_segment_cache_lock = threading.Lock()
+SEGMENT_CACHE_SIZE = 2
+
+
+def _segment_bytes(name, log_dir=None):
+    # Closed segments never change, so a couple of decompressed ones are kept around
+    # for the random access the log table does while scrolling.
+    key = (log_dir, name)
+    with _segment_cache_lock:
+        data = _segment_cache.get(key)
+        if data is not None:
+            _segment_cache.move_to_end(key)
+            return data
+    with open_segment(name, log_dir) as f:
+        data = f.read()
+    with _segment_cache_lock:
+        _segment_cache[key] = data
+        while len(_segment_cache) > SEGMENT_CACHE_SIZE:
+            _segment_cache.popitem(last=False)
+    return data
+
+
+def read_log_entries(locations, log_dir=None):
+    # Reads the entries at [(segment, offset), ...]; missing ones come back as {}.
+    entries = []
+    live = None
+    try:
+        for segment, offset in locations:
+            raw = None
+            try:
+                if segment == LIVE_SEGMENT:
+                    if live is None:
+                        live = open(segment_path(LIVE_SEGMENT, log_dir), "rb")
+                    live.seek(offset)
+                    raw = live.readline()
+                else:
+                    data = _segment_bytes(segment, log_dir)
+                    end = data.find(b"\n", offset)
+                    raw = data[offset:end if end != -1 else len(data)]
+                entries.append(json.loads(raw))
+            except Exception:
+                entries.append({})
+    finally:
+        if live is not None:
+            live.close()
+    return entries
+
+
+def _first_entry_time(path):
+    try:
+        with open(path, "rb") as f:
+            return datetime.fromisoformat(json.loads(f.readline()).get("time", "")).timestamp()
+    except Exception:
+        return None
+
+
+def _compress(src, dst, compression):
+    tmp = os.path.join(os.path.dirname(dst), "." + os.path.basename(dst) + ".tmp")
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as raw:
+            if compression == "zstd":
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as fout:
+                    shutil.copyfileobj(fin, fout, _MB)
+            else:
+                with gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=6) as fout:
+                    shutil.copyfileobj(fin, fout, _MB)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def rotate_log(cfg=None, now=None, log_dir=None):
+    # Closes the live file into a compressed segment once it is rotate_mb large or its
+    # first entry is rotate_days old, then drops the oldest segments while segments, live
+    # file and index together exceed max_total_mb. Callers hold the log write lock and
+    # sync the index afterwards, which prunes and vacuums the dropped segments' rows.
+    # Returns True when anything changed.
+    cfg = cfg or load_log_config()
+    log_dir = log_dir or get_log_dir()
+    live = segment_path(LIVE_SEGMENT, log_dir)
+    now = now or datetime.now().timestamp()
+    changed = False
+    try:
+        size = os.path.getsize(live)
+    except OSError:
+        size = 0
+    rotate_bytes = float(cfg.get("rotate_mb", 0) or 0) * _MB
+    rotate_days = float(cfg.get("rotate_days", 0) or 0)
+    due = size > 0 and rotate_bytes > 0 and size >= rotate_bytes
+    if size > 0 and not due and rotate_days > 0:
+        first = _first_entry_time(live)
+        due = first is not None and now - first >= rotate_days * 86400
+    if due:
+        stamp = datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S")
+        base = f"logs-{stamp}.jsonl"
+        n = 1
+        while any(os.path.exists(os.path.join(log_dir, base + ext)) for ext in ("", ".gz", ".zst")):
+            base = f"logs-{stamp}-{n}.jsonl"
+            n += 1
+        compression = str(cfg.get("compression", "gzip") or "none").lower()
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+        # Renamed out of the way first so readers never see a half-written segment
+        pending = os.path.join(log_dir, "." + base + ".rotating")
+        os.replace(live, pending)
+        final = os.path.join(log_dir, base)
+        try:
+            if compression in ("gzip", "zstd"):
+                final += ".gz" if compression == "gzip" else ".zst"
+                _compress(pending, final, compression)
+                os.remove(pending)
+            else:
+                os.replace(pending, final)
+        except Exception as e:
+            print(str(e))
+            os.replace(pending, os.path.join(log_dir, base))
+        changed = True
+    max_total = float(cfg.get("max_total_mb", 0) or 0) * _MB
+    if max_total > 0:
+        segments = list_log_segments(log_dir)
+        sizes = {}
+        for name in segments:
+            try:
+                sizes[name] = os.path.getsize(segment_path(name, log_dir))
+            except OSError:
+                sizes[name] = 0
+        live_size = 0 if due else size
+        index_size = 0
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                index_size += os.path.getsize(os.path.join(log_dir, INDEX_NAME + suffix))
+            except OSError:
+                pass
+        logged = sum(sizes.values()) + live_size
+        total = logged + index_size
+        for name in segments:
+            if total <= max_total:
+                break
+            try:
+                os.remove(segment_path(name, log_dir))
+            except OSError as e:
+                print(str(e))
+                continue
+            # The index shrinks roughly in proportion once the segment's rows are pruned
+            total -= sizes[name] + (index_size * sizes[name] / logged if logged else 0)
+            changed = True
+    return changed
+
+
+def clear_logs(log_dir=None):
+    for name in list_log_segments(log_dir) + [LIVE_SEGMENT]:
+        try:
+            os.remove(segment_path(name, log_dir))
+        except OSError:
+            pass
+    with _segment_cache_lock:
+        _segment_cache.clear()
@@ -0,0 +1,172 @@
+import atexit
+import threading
+import time
+from collections import deque
+from config_store import load_config
+from metrics import get_metrics
+
+
+DEFAULT_WRITER_CONFIG = {
+    "flush_interval": 1.0,
+    "batch_max": 256,
+    # "exit": leave buffering to the OS and fsync on shutdown; "periodic": also fsync
+    # every fsync_interval seconds; "always": fsync after every batch.
+    "durability": "periodic",
+    "fsync_interval": 10.0,
+    "queue_size": 2000,
+    # What submit() does when queue_size entries are pending: "block" (up to
+    # block_timeout seconds, then drop), "drop_oldest" or "drop_newest". Callers that
+    # must never wait (the event loop) submit with block=False and get "drop_oldest".
+    "overflow": "block",
+    "block_timeout": 1.0,
+}
+
+
+def load_writer_config():
+    return load_config("log_writer_config", DEFAULT_WRITER_CONFIG)
+
+
+class LogWriter:
+    # One background thread for every append-only log. Callers submit entries to a
+    # named sink and return at once; the thread collects them for up to
+    # flush_interval and hands each sink its entries as one batch:
+    # handler(entries, sync), where sync asks the sink to make the batch durable.
+    def __init__(self):
+        self._sinks = {}
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self._closing = False
+        self._flush_now = False
+        self._last_fsync = time.monotonic()
+        self._dropped_reported = 0
+        self.stats = {"written": 0, "batches": 0, "dropped": 0, "max_pending": 0}
+
+    def register(self, name, handler):
+        self._sinks[name] = handler
+
+    def submit(self, name, entry, block=True):
+        cfg = load_writer_config()
+        size = max(1, int(cfg.get("queue_size", 2000)))
+        overflow = cfg.get("overflow", "block")
+        if overflow == "block" and not block:
+            overflow = "drop_oldest"
+        with self._cond:
+            closing = self._closing
+            if not closing and len(self._pending) >= size:
+                if overflow == "drop_oldest":
+                    while len(self._pending) >= size:
+                        self._pending.popleft()
+                        self.stats["dropped"] += 1
+                        get_metrics().count("log_writer.dropped")
+                elif overflow == "drop_newest" or not self._cond.wait_for(
+                    lambda: len(self._pending) < size or self._closing, float(cfg.get("block_timeout", 1.0))
+                ):
+                    self.stats["dropped"] += 1
+                    get_metrics().count("log_writer.dropped")
+                    return False
+                closing = self._closing
+            if not closing:
+                self._pending.append((name, entry))
+                self.stats["max_pending"] = max(self.stats["max_pending"], len(self._pending))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+        if closing:
+            # Shutting down: write through instead of losing the entry
+            self._write(name, [entry], True)
+        return True
+
+    def flush(self, timeout=None):
+        # Waits until everything submitted so far has been handed to its sink.
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, timeout=5):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            cfg = load_writer_config()
+            interval = max(0.0, float(cfg.get("flush_interval", 1.0)))
+            # A full queue is written at once rather than left blocking producers
+            batch_max = max(1, min(int(cfg.get("batch_max", 256)), int(cfg.get("queue_size", 2000))))
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing)
+                deadline = time.monotonic() + interval
+                while not (self._closing or self._flush_now or len(self._pending) >= batch_max):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                batch = list(self._pending)
+                self._pending.clear()
+                self._flush_now = False
+                self._busy = True
+                closing = self._closing
+                self._cond.notify_all()
+            durability = cfg.get("durability", "periodic")
+            now = time.monotonic()
+            sync = closing or durability == "always" or (
+                durability == "periodic" and now - self._last_fsync >= float(cfg.get("fsync_interval", 10.0))
+            )
+            if sync:
+                self._last_fsync = now
+            groups = {}
+            for name, entry in batch:
+                groups.setdefault(name, []).append(entry)
+            for name, entries in groups.items():
+                self._write(name, entries, sync)
+            with self._cond:
+                self._busy = False
+                self.stats["batches"] += 1 if batch else 0
+                self.stats["written"] += len(batch)
+                self._cond.notify_all()
+                if self.stats["dropped"] > self._dropped_reported:
+                    print(f"日志写入队列已满，丢弃了 {self.stats['dropped'] - self._dropped_reported} 条")
+                    self._dropped_reported = self.stats["dropped"]
+                if closing and not self._pending:
+                    self._thread = None
+                    return
+
+    def _write(self, name, entries, sync):
+        handler = self._sinks.get(name)
+        if handler is None:
+            print(f"未注册的日志：{name}")
+            return
+        metrics = get_metrics()
+        try:
+            with metrics.timer(f"log_writer.{name}"):
+                handler(entries, sync)
+            metrics.count(f"log_writer.{name}_entries", len(entries))
+        except Exception as e:
+            print(str(e))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def flush_log_writer():
+    get_log_writer().flush()
+
+
+def close_log_writer():
+    get_log_writer().close()
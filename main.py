@@ -1,14 +1,15 @@
 
 
 
-import json
+import asyncio
 import os
 import sys
+import threading
 import time
-import shutil
+from concurrent.futures import Future
 from datetime import datetime
 from functools import partial
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QEvent, QObject
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QEvent, QObject, QDateTime
 from PyQt5.QtGui import QPixmap, QCursor, QPainter, QBrush, QColor, QPen, QIcon
 from PyQt5.QtWidgets import (
     QApplication,
@@ -25,8 +26,8 @@ from PyQt5.QtWidgets import (
     QScrollArea,
     QSizePolicy,
     QStackedWidget,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
+    QAbstractItemView,
     QHeaderView,
     QVBoxLayout,
     QWidget,
@@ -39,97 +40,245 @@ from PyQt5.QtWidgets import (
     QSlider,
     QSpinBox,
     QCheckBox,
+    QComboBox,
+    QDateTimeEdit,
+    QTableWidget,
+    QTableWidgetItem,
 )
-from screen_capture import take_window_screenshot
-from ai_chat import AIChatClient
-
-def get_base_dir():
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    return os.path.dirname(os.path.abspath(__file__))
+from capture_backend import close_capture_backend, get_capture_backend
+from capture_pipeline import CapturePipeline, Stage, load_capture_config
+from image_codec import dhash, encode_capture, encode_with_budget, resolve_image_budget
+from change_detector import get_change_detector
+from result_cache import get_result_cache
+from behavior_store import get_behavior_store
+from behavior_summary import get_behavior_summary
+from log_index import get_log_index, start_log_index_sync
+from log_store import clear_logs
+from log_writer import close_log_writer, flush_log_writer
+from metrics import get_metrics, start_metrics, stop_metrics
+from table_models import BehaviorSource, LazyTableModel, LogSearchSource
+from screenshot_store import clear_screenshots, flush_screenshot_saver, get_screenshot_saver, screenshot_path, start_screenshot_janitor, stop_screenshot_janitor
+from async_runtime import get_runtime
+from chat_memory import SUMMARY_PROMPT, format_turns, get_chat_memory, load_chat_config
+from config_store import flush_config_store, get_base_dir, get_config_store, load_config
+from ai_chat import AIChatClient, close_sessions, load_network_config, preconnect, preconnect_from_config
+
+def _log_model_text(e):
+    text = str(e.get("model", ""))
+    if e.get("cached"):
+        text += " (缓存)"
+    return text
+
+
+DEFAULT_INTERVAL_CONFIG = {"enabled": False, "interval": 10}
+
+LOG_COLUMNS = [
+    ("时间", lambda e: str(e.get("time", ""))),
+    ("模型", _log_model_text),
+    ("用户输入", lambda e: "用户输入内容:" + str(e.get("user_input_content", "")) + "\n" + "系统提示词:" + str(e.get("system_prompt", "")) + "\n" + "图片内容:" + str(e.get("image", "无上传图片"))),
+    ("模型回答", lambda e: str(e.get("reply", ""))),
+]
+
+BEHAVIOR_COLUMNS = [
+    ("时间", lambda e: str(e.get("time", ""))),
+    ("行为", lambda e: str(e.get("behavior", ""))),
+]
 
 class CaptureWorker(QThread):
     done_info = pyqtSignal(bool, str)
     def run(self):
-        cfg_path = os.path.join(get_base_dir(), "data", "config", "monitor_apps.json")
-        model_cfg_path = os.path.join(get_base_dir(), "data", "config", "model_config.json")
-        apps = []
-        try:
-            with open(cfg_path, "r", encoding="utf-8") as f:
-                apps = (json.load(f) or {}).get("apps", [])
-        except Exception:
-            apps = []
+        metrics = get_metrics()
+        cycle_started = time.perf_counter()
+        apps = load_config("monitor_apps", {}).get("apps", []) or []
         active = [a for a in apps if a.get("status") is True and a.get("name") and a.get("exe_path")]
-        results = []
-        for a in active:
-            app_name = a.get("name", "").strip()
-            exe_path = a.get("exe_path", "").strip()
-            date_folder = datetime.now().strftime("%Y-%m-%d")
-            timestamp = str(int(time.time()))
-            base_dir = os.path.join(get_base_dir(), "data", "screenshot", app_name, date_folder)
-            os.makedirs(base_dir, exist_ok=True)
-            file_path = os.path.join(base_dir, f"{app_name}-{timestamp}.png")
-            ok, saved_path = take_window_screenshot(exe_path, file_path)
-            print((ok, saved_path))
-            if ok and saved_path:
-                results.append((a, saved_path))
-        try:
-            with open(model_cfg_path, "r", encoding="utf-8") as f:
-                mcfg = json.load(f)
-        except Exception:
-            mcfg = {}
+        mcfg = load_config("model_config", {})
         api_key = mcfg.get("api_key", "")
         base_url = mcfg.get("base_url", "")
         beh = mcfg.get("behavior_analysis", {}) or {}
         model = beh.get("model", "")
         system_prompt = beh.get("system_prompt", "")
-        behaviors = []
+        client = None
         if api_key and base_url and model:
             client = AIChatClient(api_key=api_key, base_url=base_url, model=model, system_prompt=system_prompt)
-            for a, img in results:
-                user_text = a.get("prompt", "") or ""
-                try:
-                    reply = client.chat(user_text=user_text, image_path=img)
-                    print(reply)
-                    behaviors.append(reply)
-                except Exception as e:
-                    print(str(e))
+
+        pcfg = load_capture_config()
+        backend = get_capture_backend(pcfg)
+        with metrics.timer("capture.find_windows"):
+            hwnds = backend.find_windows([a.get("exe_path", "").strip() for a in active])
+            foreground = backend.foreground(list(hwnds.values()))
+        save_screenshots = pcfg.get("save_screenshots", True)
+
+        def capture(a):
+            app_name = a.get("name", "").strip()
+            exe_path = a.get("exe_path", "").strip()
+            hwnd = hwnds.get(exe_path)
+            if hwnd is None:
+                print((False, None))
+                metrics.count("capture.window_missing")
+                return None
+            captured_at = time.time()
+            with metrics.timer("capture.grab"):
+                capture_result = backend.capture(hwnd)
+            print((capture_result is not None, app_name))
+            if capture_result is None:
+                return None
+            return (a, capture_result, captured_at)
+
+        detector = get_change_detector()
+        detect_changes = client is not None and pcfg.get("change_detection", True)
+        change_threshold = int(pcfg.get("change_threshold", 5))
+
+        def encode(item):
+            a, capture_result, captured_at = item
+            try:
+                return encode_capture_item(a, capture_result, captured_at)
+            finally:
+                # The pixel buffer goes back to the window's capture context for reuse.
+                capture_result.release()
+
+        def encode_capture_item(a, capture_result, captured_at):
+            app_name = a.get("name", "").strip()
+            frame_hash = None
+            distance = None
+            if detect_changes:
+                with metrics.timer("encode.dhash"):
+                    frame_hash = dhash(capture_result)
+                prev, distance = detector.check(app_name, frame_hash, change_threshold, a.get("prompt", "") or "", model, system_prompt)
+                if prev is not None:
+                    metrics.count("capture.unchanged")
+                    return (a, None, frame_hash, prev.get("behavior", ""), distance)
+            budget = resolve_image_budget(pcfg, model, app_name)
+            with metrics.timer("encode.image"):
+                encoded = encode_with_budget(capture_result, budget)
+            if encoded is None:
+                return None
+            if save_screenshots:
+                encoded.label = screenshot_path(app_name, encoded.extension, captured_at)
+                get_screenshot_saver().save(encoded.data, encoded.label, encoded.digest)
+            if client is None:
+                return None
+            # Base64 here so the analyze workers only splice bytes into the request.
+            with metrics.timer("encode.base64"):
+                encoded.b64
+            return (a, encoded, frame_hash, None, distance)
+
+        def analyze(item):
+            a, encoded, frame_hash, reused, distance = item
+            app_name = a.get("name", "").strip()
+            user_text = a.get("prompt", "") or ""
+            if encoded is None:
+                detector.record_skipped(app_name)
+                print(f"[{app_name}] 画面无明显变化 (距离 {distance})，沿用上次行为")
+                future = Future()
+                future.set_result(reused)
+                return (a, future, None, {"reused": True, "distance": distance}, user_text)
+            # The request runs on the shared event loop. At most analyze_concurrency are
+            # in flight; past that this stage waits, which holds back capture and
+            # encode instead of keeping every encoded frame in a pending request.
+            in_flight.acquire()
+            future = runtime.submit(client.achat(user_text=user_text, image=encoded))
+            future.add_done_callback(lambda _: in_flight.release())
+            image_info = encoded.describe()
+            image_info["distance"] = distance
+            return (a, future, frame_hash, image_info, user_text)
+
+        def analyze_batch(items):
+            # All changed frames of the round go out in one multi-image request; any
+            # app whose answer is missing or unparseable falls back to its own call.
+            pending = [item for item in items if item[1] is not None]
+            replies = {}
+            if len(pending) >= 2 and client.supports_batch():
+                size = max(2, int(pcfg.get("batch_max_images", 6)))
+                chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+                futures = [
+                    runtime.submit(client.achat_batch([(item[0].get("prompt", "") or "", item[1]) for item in chunk]))
+                    for chunk in chunks
+                ]
+                for chunk, future in zip(chunks, futures):
+                    try:
+                        answers = future.result()
+                    except Exception as e:
+                        print(str(e))
+                        continue
+                    for index, reply in answers.items():
+                        replies[id(chunk[index])] = reply
+            out = []
+            for item in items:
+                reply = replies.get(id(item))
+                if reply is None:
+                    out.append(analyze(item))
+                    continue
+                a, encoded, frame_hash, _, distance = item
+                future = Future()
+                future.set_result(reply)
+                image_info = encoded.describe()
+                image_info["distance"] = distance
+                image_info["batched"] = True
+                out.append((a, future, frame_hash, image_info, a.get("prompt", "") or ""))
+            return out
+
+        runtime = get_runtime()
+        in_flight = threading.BoundedSemaphore(max(1, int(pcfg.get("analyze_concurrency", 4))))
+        batch_mode = client is not None and pcfg.get("batch_analysis", False)
+        stages = [
+            Stage("capture", capture, workers=pcfg.get("capture_concurrency", 2)),
+            Stage("encode", encode),
+        ]
+        if client is not None and not batch_mode:
+            stages.append(Stage("analyze", analyze))
+        pipeline = CapturePipeline(stages, queue_size=pcfg.get("queue_size", 2))
+        with metrics.timer("cycle.pipeline"):
+            results = pipeline.run(active)
+            if batch_mode:
+                results = analyze_batch([r for r in results if r])
+        behaviors = []
+        waited = time.perf_counter()
+        for a, future, frame_hash, image_info, user_text in (r for r in results if r):
+            try:
+                reply = future.result()
+            except Exception as e:
+                print(str(e))
+                continue
+            print(reply)
+            if frame_hash is not None:
+                detector.record_analysed(a.get("name", "").strip(), frame_hash, reply, user_text, model, system_prompt)
+                metrics.count("capture.analysed")
+            behaviors.append((a, reply, image_info))
+        metrics.observe("cycle.analyze_wait", (time.perf_counter() - waited) * 1000)
+        if detect_changes:
+            detector.save()
+        store = get_behavior_store()
+        summary = get_behavior_summary()
+        if summary.is_empty():
+            # First run (or after a reset): seed today's state from the stored log once.
+            start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+            summary.rebuild(store.range(start_ts=start))
+        entries = []
         if behaviors:
-            log_dir = os.path.join(get_base_dir(), "data", "log")
-            os.makedirs(log_dir, exist_ok=True)
             t = datetime.now().strftime("%Y-%m-%d %H:%M")
-            entries = [{"time": t, "behavior": b} for b in behaviors]
-            path = os.path.join(log_dir, "behavior-log.json")
-            try:
-                if os.path.isfile(path):
-                    with open(path, "r", encoding="utf-8") as f:
-                        old = json.load(f)
-                    if isinstance(old, list):
-                        entries = old + entries
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(entries, f, ensure_ascii=False, indent=2)
-            except Exception:
-                pass
+            entries = [
+                {
+                    "time": t,
+                    "behavior": b,
+                    "app": a.get("name", ""),
+                    "image": image_info,
+                    "foreground": foreground is not None and hwnds.get(a.get("exe_path", "").strip()) == foreground,
+                }
+                for a, b, image_info in behaviors
+            ]
+            with metrics.timer("cycle.summary"):
+                store.append_async(entries)
+                summary.update(entries)
+                summary.save()
         warn_no_entries = False
         reply_text = ""
         try:
-            log_dir = os.path.join(get_base_dir(), "data", "log")
-            bl_path = os.path.join(log_dir, "behavior-log.json")
-            lines = []
-            if os.path.isfile(bl_path):
-                with open(bl_path, "r", encoding="utf-8") as f:
-                    arr = json.load(f)
-                if isinstance(arr, list) and arr:
-                    tail = arr[-6:]
-                    for item in tail:
-                        t = str(item.get("time", ""))
-                        b = str(item.get("behavior", ""))
-                        lines.append(f"行为时间：{t} 行为：{b}")
-            if not lines:
+            overview = summary.text()
+            if not overview:
                 warn_no_entries = False
                 user_text = "要告知用户其应用截图功能未正常运行"
             else:
-                user_text = "以下是用户最近的应用操作行为\n" + "\n".join(lines)
+                user_text = "以下是用户今天的应用使用概况\n" + overview
             api_key = mcfg.get("api_key", "")
             base_url = mcfg.get("base_url", "")
             syscfg = mcfg.get("system_call", {}) or {}
@@ -137,29 +286,55 @@ class CaptureWorker(QThread):
             sc_prompt = syscfg.get("system_prompt", "")
             if api_key and base_url and sc_model:
                 sc_client = AIChatClient(api_key=api_key, base_url=base_url, model=sc_model, system_prompt=sc_prompt)
-                reply_text = sc_client.chat(user_text=user_text, image_path=None)
+                with metrics.timer("cycle.supervisor"):
+                    reply_text = sc_client.chat(user_text=user_text, image_path=None)
                 print(reply_text)
         except Exception as e:
             pass
+        metrics.observe("cycle.total", (time.perf_counter() - cycle_started) * 1000)
+        metrics.count("cycle.frames", len(active))
         self.done_info.emit(warn_no_entries, reply_text)
 
+class ScreenshotClearWorker(QThread):
+    progress = pyqtSignal(int, int)
+
+    def run(self):
+        try:
+            clear_screenshots(self.progress.emit)
+        except Exception as e:
+            print(str(e))
+
 class Signals(QObject):
     scale_changed = pyqtSignal(float)
+    config_reloaded = pyqtSignal(str)
 
 global_signals = Signals()
+get_config_store().add_listener(global_signals.config_reloaded.emit)
 
-class ChatWorker(QThread):
+class ChatWorker(QObject):
+    # Runs one chat request as a task on the shared event loop instead of a thread of
+    # its own. Signals are emitted from the loop thread and delivered queued.
     reply_signal = pyqtSignal(str)
+    partial_signal = pyqtSignal(str)
 
     def __init__(self, user_text):
         super().__init__()
         self.user_text = user_text
+        self.future = None
 
-    def run(self):
+    def start(self):
+        self.future = get_runtime().submit(self._run())
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+
+    def is_running(self):
+        return self.future is not None and not self.future.done()
+
+    async def _run(self):
         try:
-            model_cfg_path = os.path.join(get_base_dir(), "data", "config", "model_config.json")
-            with open(model_cfg_path, "r", encoding="utf-8") as f:
-                mcfg = json.load(f)
+            mcfg = load_config("model_config", {})
             
             api_key = mcfg.get("api_key", "")
             base_url = mcfg.get("base_url", "")
@@ -170,10 +345,38 @@ class ChatWorker(QThread):
             if api_key and base_url and model:
                 client = AIChatClient(api_key=api_key, base_url=base_url, model=model, system_prompt=system_prompt)
                 full_input = "用户现在不想提供应用活动日志，向你发送了对话聊天，内容如下" + self.user_text
-                reply = client.chat(user_text=full_input, image_path=None)
+                memory = get_chat_memory() if load_chat_config().get("memory_enabled", True) else None
+                history = memory.messages() if memory is not None else None
+                if load_network_config().get("stream_chat", True):
+                    text = ""
+                    async for piece in client.achat_stream(user_text=full_input, image_path=None, history=history):
+                        text += piece
+                        self.partial_signal.emit(text)
+                    if not text:
+                        raise RuntimeError("Empty response")
+                    timing = client.last_timing or {}
+                    print(f"首字延迟 {timing.get('ttft_ms')} ms，总耗时 {timing.get('total_ms')} ms")
+                    reply = text
+                else:
+                    reply = await client.achat(user_text=full_input, image_path=None, history=history)
+                if memory is not None:
+                    await asyncio.to_thread(memory.add_turn, self.user_text, reply)
                 self.reply_signal.emit(reply)
+                if memory is not None:
+                    # Older turns are folded into the summary in a task of its own, so
+                    # compaction never delays an answer and a newer message that
+                    # cancels this worker does not cancel it.
+                    summarizer = AIChatClient(api_key=api_key, base_url=base_url, model=model, system_prompt=SUMMARY_PROMPT, use_cache=False)
+
+                    async def summarize(previous, turns):
+                        prompt = f"已有摘要：{previous or '无'}\n新的对话：\n{format_turns(turns)}"
+                        return await summarizer.achat(user_text=prompt, temperature=0.2, max_tokens=512)
+
+                    get_runtime().submit(memory.compact(summarize))
             else:
                 self.reply_signal.emit("配置缺失，请检查模型配置。")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             self.reply_signal.emit(f"发生错误: {str(e)}")
 
@@ -223,8 +426,24 @@ class ChatDialog(QDialog):
             }
         """)
         self.send_btn.clicked.connect(self._on_send)
+
+        self.forget_btn = QPushButton("清空记忆")
+        self.forget_btn.setCursor(Qt.PointingHandCursor)
+        self.forget_btn.setStyleSheet("""
+            QPushButton {
+                background-color: transparent;
+                color: #888;
+                border: none;
+                padding: 4px 6px;
+            }
+            QPushButton:hover {
+                color: #4a90e2;
+            }
+        """)
+        self.forget_btn.clicked.connect(self._on_forget)
         
         btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.forget_btn)
         btn_layout.addStretch()
         btn_layout.addWidget(self.send_btn)
         
@@ -240,6 +459,10 @@ class ChatDialog(QDialog):
             self.input_edit.clear()
             self.hide()
             
+    def _on_forget(self):
+        get_chat_memory().clear()
+        self.input_edit.setPlaceholderText("记忆已清空，和我说说话吧...")
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
             if event.modifiers() & Qt.ShiftModifier:
@@ -278,6 +501,14 @@ class SpeechBubble(QLabel):
         self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.hide)
 
+        # Streamed text is applied at most once per interval instead of per token.
+        self._pending_text = None
+        self._anchor = None
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.setInterval(60)
+        self.stream_timer.timeout.connect(self._apply_pending_text)
+
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -301,6 +532,26 @@ class SpeechBubble(QLabel):
         super().paintEvent(event)
 
     def show_message(self, text, target_rect, screen_width, duration=10000):
+        self.stream_timer.stop()
+        self._pending_text = None
+        self._set_text_at(text, target_rect, screen_width)
+        self.timer.start(duration)
+
+    def stream_message(self, text, target_rect, screen_width):
+        # Partial reply while a stream is running; stays up until show_message().
+        self._pending_text = text
+        self._anchor = (target_rect, screen_width)
+        self.timer.stop()
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+
+    def _apply_pending_text(self):
+        if self._pending_text is None or self._anchor is None:
+            return
+        text, self._pending_text = self._pending_text, None
+        self._set_text_at(text, *self._anchor)
+
+    def _set_text_at(self, text, target_rect, screen_width):
         self.setText(text)
         self.adjustSize()
         
@@ -326,7 +577,6 @@ class SpeechBubble(QLabel):
             
         self.move(x, y)
         self.show()
-        self.timer.start(duration)
 
 class ButtonPanel(QWidget):
     def __init__(self, parent=None):
@@ -352,8 +602,14 @@ class SettingsWindow(QMainWindow):
         if os.path.exists(icon_path):
             self.setWindowIcon(QIcon(icon_path))
             
+        self._log_generation = -1
         self._build_ui()
 
+        self._live_timer = QTimer(self)
+        self._live_timer.setInterval(1000)
+        self._live_timer.timeout.connect(self._on_live_tick)
+        self._live_timer.start()
+
     def _build_ui(self):
         root = QWidget()
         root_layout = QHBoxLayout(root)
@@ -367,6 +623,7 @@ class SettingsWindow(QMainWindow):
         self.nav_list.addItem("模型配置")
         self.nav_list.addItem("人物大小")
         self.nav_list.addItem("执行间隔")
+        self.nav_list.addItem("性能")
         self.nav_list.setFixedWidth(180)
         self.nav_list.setStyleSheet("""
             QListWidget {
@@ -400,6 +657,7 @@ class SettingsWindow(QMainWindow):
         self.stacked.addWidget(self._build_model_config_page())
         self.stacked.addWidget(self._build_scale_page())
         self.stacked.addWidget(self._build_interval_page())
+        self.stacked.addWidget(self._build_performance_page())
 
         root_layout.addWidget(self.nav_list)
         root_layout.addWidget(self.stacked, 1)
@@ -432,15 +690,7 @@ class SettingsWindow(QMainWindow):
         h_layout.setSpacing(20)
 
         # Load current scale
-        current_scale = 1.0
-        config_path = os.path.join(get_base_dir(), "data", "config", "ui_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    ui_cfg = json.load(f)
-                    current_scale = ui_cfg.get("scale", 1.0)
-            except:
-                pass
+        current_scale = load_config("ui_config", {"scale": 1.0}).get("scale", 1.0)
 
         self.scale_slider = QSlider(Qt.Horizontal)
         self.scale_slider.setRange(50, 200)
@@ -519,17 +769,9 @@ class SettingsWindow(QMainWindow):
         form_layout.setSpacing(20)
 
         # Load current config
-        self.interval_enabled = False
-        self.interval_minutes = 10
-        config_path = os.path.join(get_base_dir(), "data", "config", "interval_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-                    self.interval_enabled = cfg.get("enabled", False)
-                    self.interval_minutes = cfg.get("interval", 10)
-            except:
-                pass
+        cfg = load_config("interval_config", DEFAULT_INTERVAL_CONFIG)
+        self.interval_enabled = cfg.get("enabled", False)
+        self.interval_minutes = cfg.get("interval", 10)
 
         self.interval_check = QCheckBox("开启自动执行")
         self.interval_check.setChecked(self.interval_enabled)
@@ -565,25 +807,88 @@ class SettingsWindow(QMainWindow):
     def _save_interval_config(self):
         enabled = self.interval_check.isChecked()
         interval = self.interval_spin.value()
-        
-        config_path = os.path.join(get_base_dir(), "data", "config", "interval_config.json")
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump({"enabled": enabled, "interval": interval}, f)
-        except:
-            pass
+        get_config_store().update("interval_config", {"enabled": enabled, "interval": interval})
+
+    def _build_performance_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(12)
+
+        title = QLabel("性能")
+        title.setStyleSheet("font-size: 18px; font-weight: bold; color: #333; margin-bottom: 10px;")
+
+        description = QLabel("统计截图、编码、模型请求和日志写入各阶段的耗时（毫秒，最近样本的分位数），并定期写入 data/log/metrics.jsonl。")
+        description.setWordWrap(True)
+        description.setStyleSheet("color: #666; font-size: 14px;")
+
+        self._metrics_check = QCheckBox("开启性能统计")
+        self._metrics_check.setChecked(get_metrics().enabled)
+        self._metrics_check.setStyleSheet("font-size: 14px;")
+        self._metrics_check.stateChanged.connect(self._save_metrics_config)
+
+        reset_button = QPushButton("重置统计")
+        reset_button.clicked.connect(self._reset_metrics)
+        controls = QHBoxLayout()
+        controls.addWidget(self._metrics_check)
+        controls.addStretch(1)
+        controls.addWidget(reset_button)
+
+        self._metrics_table = QTableWidget(0, 8)
+        self._metrics_table.setHorizontalHeaderLabels(["阶段", "次数", "每分钟", "平均", "p50", "p95", "p99", "最大"])
+        self._metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self._metrics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self._metrics_table.verticalHeader().setVisible(False)
+        self._metrics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        self._metrics_counters_label = QLabel()
+        self._metrics_counters_label.setWordWrap(True)
+        self._metrics_counters_label.setStyleSheet("color: #666; font-size: 13px;")
+
+        layout.addWidget(title)
+        layout.addWidget(description)
+        layout.addLayout(controls)
+        layout.addWidget(self._metrics_table, 1)
+        layout.addWidget(self._metrics_counters_label)
+        self._refresh_metrics_page()
+        return page
+
+    def _save_metrics_config(self):
+        enabled = self._metrics_check.isChecked()
+        get_config_store().update("metrics_config", {"enabled": enabled})
+        get_metrics().configure()
+        self._refresh_metrics_page()
+
+    def _reset_metrics(self):
+        get_metrics().reset()
+        self._refresh_metrics_page()
+
+    def _refresh_metrics_page(self):
+        metrics = get_metrics()
+        if not metrics.enabled:
+            self._metrics_table.setRowCount(0)
+            self._metrics_counters_label.setText("性能统计未开启")
+            return
+        snap = metrics.snapshot()
+        timers = snap["timers"]
+        self._metrics_table.setRowCount(len(timers))
+        for row, (name, t) in enumerate(timers.items()):
+            values = [name, str(t["count"]), str(t["per_min"])]
+            values += [f"{t[k]:.1f}" for k in ("mean", "p50", "p95", "p99", "max")]
+            for col, text in enumerate(values):
+                item = self._metrics_table.item(row, col)
+                if item is None:
+                    self._metrics_table.setItem(row, col, QTableWidgetItem(text))
+                else:
+                    item.setText(text)
+        counters = snap["counters"]
+        text = "，".join(f"{k} {v}" for k, v in sorted(counters.items()))
+        self._metrics_counters_label.setText(("计数：" + text) if text else "暂无计数")
 
     def _on_scale_changed(self, value):
         scale = value / 100.0
-        # Save to config
-        config_path = os.path.join(get_base_dir(), "data", "config", "ui_config.json")
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump({"scale": scale}, f)
-        except:
-            pass
+        # Save to config; slider drags are coalesced into one write
+        get_config_store().update("ui_config", {"scale": scale})
         
         # Emit signal to update main window
         global_signals.scale_changed.emit(scale)
@@ -632,8 +937,6 @@ class SettingsWindow(QMainWindow):
             }
         """)
 
-        self._config_path = os.path.join(get_base_dir(), "data", "config", "monitor_apps.json")
-        os.makedirs(os.path.dirname(self._config_path), exist_ok=True)
         data = self._load_monitor_config()
         self.app_slots = []
         for idx in range(1, 5):
@@ -654,9 +957,9 @@ class SettingsWindow(QMainWindow):
             
         self.stacked.setCurrentIndex(idx)
         if idx == 1 and hasattr(self, "_logs_table"):
-            self._populate_logs_table(self._logs_table)
+            self._populate_logs_table()
         if idx == 2 and hasattr(self, "_behavior_table"):
-            self._populate_behavior_table(self._behavior_table)
+            self._populate_behavior_table()
 
     def _build_model_config_page(self):
         page = QWidget()
@@ -668,8 +971,6 @@ class SettingsWindow(QMainWindow):
         title.setStyleSheet("font-size: 18px; font-weight: bold; color: #333; margin-bottom: 10px;")
         layout.addWidget(title)
 
-        self._model_config_path = os.path.join(get_base_dir(), "data", "config", "model_config.json")
-        os.makedirs(os.path.dirname(self._model_config_path), exist_ok=True)
         cfg = self._load_model_config()
 
         # Global Config Group
@@ -794,18 +1095,12 @@ class SettingsWindow(QMainWindow):
         return page
 
     def _load_model_config(self):
-        if os.path.isfile(self._model_config_path):
-            try:
-                with open(self._model_config_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception:
-                pass
-        return {
+        return load_config("model_config", {
             "api_key": "",
             "base_url": "",
             "system_call": {"model": "", "system_prompt": ""},
             "behavior_analysis": {"model": "", "system_prompt": ""},
-        }
+        })
 
     def _save_model_config(self):
         data = {
@@ -821,8 +1116,9 @@ class SettingsWindow(QMainWindow):
             },
         }
         try:
-            with open(self._model_config_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            store = get_config_store()
+            store.update("model_config", data)
+            store.flush()
             QMessageBox.information(self, "提示", "保存成功")
         except Exception as e:
             QMessageBox.warning(self, "错误", "保存失败")
@@ -836,58 +1132,134 @@ class SettingsWindow(QMainWindow):
         title = QLabel("日志记录")
         title.setStyleSheet("font-size: 16px; font-weight: 600;")
 
-        table = QTableWidget()
-        table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(["时间", "模型", "用户输入", "模型回答"])
-        table.setWordWrap(True)
-        self._populate_logs_table(table)
-        header = table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.Stretch)
-        table.verticalHeader().setVisible(False)
-        table.setEditTriggers(QTableWidget.NoEditTriggers)
-        table.cellDoubleClicked.connect(self._on_log_cell_double_clicked)
+        filters = QHBoxLayout()
+        self._log_search_edit = QLineEdit()
+        self._log_search_edit.setPlaceholderText("搜索用户输入或模型回答...")
+        self._log_search_edit.setClearButtonEnabled(True)
+        self._log_model_combo = QComboBox()
+        self._log_model_combo.addItem("全部模型", "")
+        self._log_model_combo.setMinimumWidth(140)
+        self._log_time_check = QCheckBox("时间范围")
+        now = QDateTime.currentDateTime()
+        self._log_start_edit = QDateTimeEdit(now.addDays(-7))
+        self._log_end_edit = QDateTimeEdit(now.addDays(1))
+        for edit in (self._log_start_edit, self._log_end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+            edit.setEnabled(False)
+        filters.addWidget(self._log_search_edit, 1)
+        filters.addWidget(self._log_model_combo)
+        filters.addWidget(self._log_time_check)
+        filters.addWidget(self._log_start_edit)
+        filters.addWidget(QLabel("至"))
+        filters.addWidget(self._log_end_edit)
+
+        # Query-as-you-type, debounced so each keystroke does not hit the index.
+        self._log_search_timer = QTimer(self)
+        self._log_search_timer.setSingleShot(True)
+        self._log_search_timer.setInterval(200)
+        self._log_search_timer.timeout.connect(self._populate_logs_table)
+        self._log_search_edit.textChanged.connect(self._log_search_timer.start)
+        self._log_model_combo.currentIndexChanged.connect(self._log_search_timer.start)
+        self._log_time_check.toggled.connect(self._log_start_edit.setEnabled)
+        self._log_time_check.toggled.connect(self._log_end_edit.setEnabled)
+        self._log_time_check.toggled.connect(self._log_search_timer.start)
+        self._log_start_edit.dateTimeChanged.connect(self._log_search_timer.start)
+        self._log_end_edit.dateTimeChanged.connect(self._log_search_timer.start)
+
+        self._log_result_label = QLabel()
+        self._log_result_label.setStyleSheet("color: #666; font-size: 13px;")
+
+        self._logs_model = LazyTableModel(LOG_COLUMNS, parent=self)
+        table = self._build_lazy_table(self._logs_model)
+        table.doubleClicked.connect(self._on_log_cell_double_clicked)
+        self._logs_table = table
+
+        self._cache_stats_label = QLabel()
+        self._cache_stats_label.setStyleSheet("color: #666; font-size: 13px;")
+        self._populate_logs_table()
 
         layout.addWidget(title)
+        layout.addLayout(filters)
+        layout.addWidget(self._log_result_label)
         layout.addWidget(table, 1)
         actions = QHBoxLayout()
         clear_button = QPushButton("清除日志")
         clear_button.clicked.connect(self._clear_logs_and_refresh)
+        actions.addWidget(self._cache_stats_label)
         actions.addStretch(1)
         actions.addWidget(clear_button)
         layout.addLayout(actions)
         return page
 
-    def _populate_logs_table(self, table: QTableWidget):
-        log_dir = os.path.join(get_base_dir(), "data", "log")
-        entries = []
-        path = os.path.join(log_dir, "logs.jsonl")
-        if os.path.isfile(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            obj = json.loads(line)
-                            entries.append(obj)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-        table.setRowCount(len(entries))
-        for i, e in enumerate(entries):
-            time_item = QTableWidgetItem(str(e.get("time", "")))
-            model_item = QTableWidgetItem(str(e.get("model", "")))
-            user_input = "用户输入内容:" + str(e.get("user_input_content", "")) + "\n" + "系统提示词:" + str(e.get("system_prompt", "")) + "\n" + "图片内容:" + str(e.get("image", "无上传图片"))
-            user_item = QTableWidgetItem(user_input)
-            reply_item = QTableWidgetItem(str(e.get("reply", "")))
-            table.setItem(i, 0, time_item)
-            table.setItem(i, 1, model_item)
-            table.setItem(i, 2, user_item)
-            table.setItem(i, 3, reply_item)
-        self._logs_table = table
+    def _build_lazy_table(self, model):
+        table = QTableView()
+        table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        table.setModel(model)
+        table.setWordWrap(True)
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        # Fixed row heights so the view never measures rows it is not showing.
+        table.verticalHeader().setVisible(False)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(60)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        return table
+
+    def _populate_logs_table(self):
+        index = get_log_index()
+        started = time.perf_counter()
+        try:
+            # Never synced here: the startup thread and the log writer keep the index
+            # current, and the live tick picks up whatever they add.
+            self._log_generation = index.generation
+            self._refresh_log_models(index.models())
+            text = self._log_search_edit.text().strip()
+            model = self._log_model_combo.currentData() or None
+            start_ts = end_ts = None
+            if self._log_time_check.isChecked():
+                start_ts = self._log_start_edit.dateTime().toSecsSinceEpoch()
+                end_ts = self._log_end_edit.dateTime().toSecsSinceEpoch()
+            source = LogSearchSource(index, text, model, start_ts, end_ts)
+        except Exception as e:
+            print(str(e))
+            source = None
+        self._logs_model.set_source(source)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._log_query_ms = elapsed_ms
+        self._update_log_result_label()
+        self._update_cache_stats_label()
+
+    def _update_log_result_label(self):
+        source = self._logs_model.source
+        total = source.total if source is not None else 0
+        count = f"超过 {total}" if source is not None and total >= source.COUNT_CAP else str(total)
+        self._log_result_label.setText(f"共 {count} 条（查询耗时 {self._log_query_ms:.0f} ms）")
+
+    def _refresh_log_models(self, models):
+        current = self._log_model_combo.currentData() or ""
+        existing = [self._log_model_combo.itemData(i) for i in range(1, self._log_model_combo.count())]
+        if existing == models:
+            return
+        self._log_model_combo.blockSignals(True)
+        self._log_model_combo.clear()
+        self._log_model_combo.addItem("全部模型", "")
+        for m in models:
+            self._log_model_combo.addItem(m, m)
+        idx = self._log_model_combo.findData(current)
+        self._log_model_combo.setCurrentIndex(idx if idx >= 0 else 0)
+        self._log_model_combo.blockSignals(False)
+
+    def _update_cache_stats_label(self):
+        cache = get_result_cache()
+        if cache is None:
+            self._cache_stats_label.setText("识图结果缓存：未启用")
+            return
+        stats = cache.stats()
+        self._cache_stats_label.setText(
+            f"识图结果缓存：命中 {stats['hits']} 次，未命中 {stats['misses']} 次（命中率 {stats['hit_rate'] * 100:.1f}%），"
+            f"缓存 {stats['entries']} 条"
+        )
 
     def _build_behavior_page(self):
         page = QWidget()
@@ -898,98 +1270,129 @@ class SettingsWindow(QMainWindow):
         title = QLabel("行为记录")
         title.setStyleSheet("font-size: 16px; font-weight: 600;")
 
-        table = QTableWidget()
-        table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        table.setColumnCount(2)
-        table.setHorizontalHeaderLabels(["时间", "行为"])
-        header = table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.Stretch)
-        table.verticalHeader().setVisible(False)
-        table.setEditTriggers(QTableWidget.NoEditTriggers)
-        table.cellDoubleClicked.connect(self._on_behavior_cell_double_clicked)
-        self._populate_behavior_table(table)
+        self._behavior_model = LazyTableModel(BEHAVIOR_COLUMNS, parent=self)
+        table = self._build_lazy_table(self._behavior_model)
+        table.doubleClicked.connect(self._on_behavior_cell_double_clicked)
+        self._behavior_table = table
+
+        self._change_stats_label = QLabel()
+        self._change_stats_label.setStyleSheet("color: #666; font-size: 13px;")
+        self._populate_behavior_table()
+
+        self._clear_progress_label = QLabel()
+        self._clear_progress_label.setStyleSheet("color: #666; font-size: 13px;")
 
         actions = QHBoxLayout()
         clear_button = QPushButton("清除行为日志")
         clear_button.clicked.connect(self._clear_behavior_logs_and_refresh)
+        self._clear_behavior_button = clear_button
+        actions.addWidget(self._change_stats_label)
         actions.addStretch(1)
+        actions.addWidget(self._clear_progress_label)
         actions.addWidget(clear_button)
 
         layout.addWidget(title)
         layout.addWidget(table, 1)
         layout.addLayout(actions)
-        self._behavior_table = table
         return page
 
-    def _populate_behavior_table(self, table: QTableWidget):
-        log_dir = os.path.join(get_base_dir(), "data", "log")
-        path = os.path.join(log_dir, "behavior-log.json")
-        entries = []
-        if os.path.isfile(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    entries = json.load(f)
-                if not isinstance(entries, list):
-                    entries = []
-            except Exception:
-                entries = []
-        table.setRowCount(len(entries))
-        for i, e in enumerate(entries):
-            time_item = QTableWidgetItem(str(e.get("time", "")))
-            behavior_item = QTableWidgetItem(str(e.get("behavior", "")))
-            table.setItem(i, 0, time_item)
-            table.setItem(i, 1, behavior_item)
-        self._behavior_table = table
+    def _populate_behavior_table(self):
+        try:
+            source = BehaviorSource(get_behavior_store())
+        except Exception as e:
+            print(str(e))
+            source = None
+        self._behavior_model.set_source(source)
+        self._update_change_stats_label()
+
+    def _on_live_tick(self):
+        # Appends new log/behavior rows to the visible table instead of repopulating it.
+        if not self.isVisible():
+            return
+        idx = self.stacked.currentIndex()
+        try:
+            if idx == 1 and hasattr(self, "_logs_table"):
+                # The log writer keeps the index in sync after every batch; here only
+                # its generation counter is read to see whether there is anything new.
+                generation = get_log_index().generation
+                if generation == self._log_generation:
+                    return
+                self._log_generation = generation
+                self._refresh_log_models(get_log_index().models())
+                if self._tail_table(self._logs_table, self._logs_model):
+                    self._update_log_result_label()
+                    self._update_cache_stats_label()
+            elif idx == 2 and hasattr(self, "_behavior_table"):
+                if self._tail_table(self._behavior_table, self._behavior_model):
+                    self._update_change_stats_label()
+            elif idx == 6 and hasattr(self, "_metrics_table"):
+                self._refresh_metrics_page()
+        except Exception as e:
+            print(str(e))
+
+    def _tail_table(self, table, model):
+        bar = table.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum() - 2
+        added = model.refresh()
+        if added and at_bottom:
+            table.scrollToBottom()
+        return added
+
+    def _update_change_stats_label(self):
+        stats = get_change_detector().stats()
+        analysed = stats.get("analysed", 0)
+        skipped = stats.get("skipped", 0)
+        total = analysed + skipped
+        ratio = (skipped * 100.0 / total) if total else 0.0
+        self._change_stats_label.setText(f"画面变化检测：分析 {analysed} 次，跳过 {skipped} 次（跳过率 {ratio:.1f}%）")
 
     def _clear_behavior_logs_and_refresh(self):
-        log_dir = os.path.join(get_base_dir(), "data", "log")
-        path = os.path.join(log_dir, "behavior-log.json")
-        if os.path.isfile(path):
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-        # Also clear all screenshots under data/screenshot
-        shots_dir = os.path.join(get_base_dir(), "data", "screenshot")
-        if os.path.isdir(shots_dir):
-            try:
-                shutil.rmtree(shots_dir, ignore_errors=True)
-                os.makedirs(shots_dir, exist_ok=True)
-            except Exception:
-                pass
+        try:
+            get_behavior_store().clear()
+            get_behavior_summary().reset()
+        except Exception:
+            pass
         if hasattr(self, "_behavior_table"):
-            self._populate_behavior_table(self._behavior_table)
-
-    def _on_behavior_cell_double_clicked(self, row, col):
-        if not hasattr(self, "_behavior_table"):
+            self._populate_behavior_table()
+        # Also clear all screenshots under data/screenshot, off the UI thread
+        if getattr(self, "_screenshot_clear_worker", None) is not None and self._screenshot_clear_worker.isRunning():
             return
-        item = self._behavior_table.item(row, col)
-        if not item:
+        self._clear_behavior_button.setEnabled(False)
+        self._clear_progress_label.setText("正在清理截图…")
+        self._screenshot_clear_worker = ScreenshotClearWorker(self)
+        self._screenshot_clear_worker.progress.connect(self._on_screenshot_clear_progress)
+        self._screenshot_clear_worker.finished.connect(self._on_screenshot_clear_finished)
+        self._screenshot_clear_worker.start()
+
+    def _on_screenshot_clear_progress(self, done, total):
+        self._clear_progress_label.setText(f"正在清理截图… {done}/{total}")
+
+    def _on_screenshot_clear_finished(self):
+        self._clear_behavior_button.setEnabled(True)
+        self._clear_progress_label.setText("截图已清理")
+
+    def _on_behavior_cell_double_clicked(self, index):
+        if not index.isValid():
             return
         title = "行为详情"
-        self._show_text_dialog(title, item.text())
+        self._show_text_dialog(title, self._behavior_model.cell_text(index.row(), index.column()))
 
     def _clear_logs_and_refresh(self):
-        log_dir = os.path.join(get_base_dir(), "data", "log")
-        path = os.path.join(log_dir, "logs.jsonl")
-        if os.path.isfile(path):
-            try:
-                os.remove(path)
-            except Exception:
-                pass
+        flush_log_writer()
+        clear_logs()
+        try:
+            get_log_index().clear()
+        except Exception:
+            pass
         if hasattr(self, "_logs_table"):
-            self._populate_logs_table(self._logs_table)
+            self._populate_logs_table()
 
-    def _on_log_cell_double_clicked(self, row, col):
+    def _on_log_cell_double_clicked(self, index):
+        col = index.column()
         if col not in (2, 3):
             return
-        if not hasattr(self, "_logs_table"):
-            return
-        item = self._logs_table.item(row, col)
-        if not item:
-            return
         title = "用户输入详情" if col == 2 else "模型回答详情"
-        self._show_text_dialog(title, item.text())
+        self._show_text_dialog(title, self._logs_model.cell_text(index.row(), col))
 
     def _show_text_dialog(self, title, text):
         dlg = QDialog(self)
@@ -1166,25 +1569,27 @@ class SettingsWindow(QMainWindow):
         if not exe_path:
             return
         app_name = self._sanitize_name(name_edit.text())
-        date_folder = datetime.now().strftime("%Y-%m-%d")
-        timestamp = str(int(time.time()))
-        base_dir = os.path.join(get_base_dir(), "data", "screenshot", app_name, date_folder)
-        os.makedirs(base_dir, exist_ok=True)
-        file_path = os.path.join(base_dir, f"{app_name}-{timestamp}.png")
-        ok, saved_path = take_window_screenshot(exe_path, file_path)
-        print((ok, saved_path))
+        backend = get_capture_backend()
+        hwnd = backend.find_windows([exe_path]).get(exe_path)
+        capture = backend.capture(hwnd) if hwnd is not None else None
+        ok = False
+        file_path = None
+        if capture is not None:
+            try:
+                encoded = encode_capture(capture, "PNG")
+            finally:
+                capture.release()
+            if encoded is not None:
+                # Stored like the capture round's screenshots, so retention sees it too
+                file_path = screenshot_path(app_name, encoded.extension)
+                get_screenshot_saver().save(encoded.data, file_path, encoded.digest)
+                ok = True
+        print((ok, file_path if ok else None, backend.name))
 
     def _load_monitor_config(self):
-        if not os.path.isfile(self._config_path):
-            return [{"id": i, "status": False, "name": "", "exe_path": "", "prompt": ""} for i in range(1, 5)]
-        try:
-            with open(self._config_path, "r", encoding="utf-8") as f:
-                obj = json.load(f)
-            apps = obj.get("apps")
-            if isinstance(apps, list):
-                return apps
-        except Exception:
-            pass
+        apps = load_config("monitor_apps", {}).get("apps")
+        if isinstance(apps, list):
+            return apps
         return [{"id": i, "status": False, "name": "", "exe_path": "", "prompt": ""} for i in range(1, 5)]
 
     def _save_monitor_config(self):
@@ -1201,11 +1606,7 @@ class SettingsWindow(QMainWindow):
                 "exe_path": path,
                 "prompt": prompt,
             })
-        try:
-            with open(self._config_path, "w", encoding="utf-8") as f:
-                json.dump({"apps": apps}, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+        get_config_store().update("monitor_apps", {"apps": apps})
 
 class PetWindow(QWidget):
     def __init__(self):
@@ -1227,20 +1628,12 @@ class PetWindow(QWidget):
         
         self._build_ui()
         self._init_tray_icon()
+        preconnect_from_config()
 
     def _on_loop_tick(self):
-        enabled = False
-        interval_min = 10
-        
-        config_path = os.path.join(get_base_dir(), "data", "config", "interval_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-                    enabled = cfg.get("enabled", False)
-                    interval_min = cfg.get("interval", 10)
-            except:
-                pass
+        cfg = load_config("interval_config", DEFAULT_INTERVAL_CONFIG)
+        enabled = cfg.get("enabled", False)
+        interval_min = cfg.get("interval", 10)
         
         if enabled:
             self._capture_all()
@@ -1318,15 +1711,7 @@ class PetWindow(QWidget):
         self.original_pixmap = QPixmap(image_path)
         
         # Load scale config
-        self.current_scale = 1.0
-        config_path = os.path.join(get_base_dir(), "data", "config", "ui_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    ui_cfg = json.load(f)
-                    self.current_scale = ui_cfg.get("scale", 1.0)
-            except:
-                pass
+        self.current_scale = load_config("ui_config", {"scale": 1.0}).get("scale", 1.0)
 
         self._update_image_scale()
         
@@ -1376,6 +1761,12 @@ class PetWindow(QWidget):
         
         # Connect signal
         global_signals.scale_changed.connect(self._on_scale_changed)
+        global_signals.config_reloaded.connect(self._on_config_reloaded)
+
+        # Pick up config files edited outside the app
+        self.config_poll_timer = QTimer(self)
+        self.config_poll_timer.timeout.connect(get_config_store().poll)
+        self.config_poll_timer.start(2000)
 
     def _update_image_scale(self):
         if self.original_pixmap.isNull():
@@ -1397,6 +1788,18 @@ class PetWindow(QWidget):
         self.current_scale = scale
         self._update_image_scale()
 
+    def _on_config_reloaded(self, name):
+        if name == "ui_config":
+            scale = load_config("ui_config", {"scale": 1.0}).get("scale", 1.0)
+            if scale != self.current_scale:
+                self._on_scale_changed(scale)
+        elif name == "interval_config":
+            # Restart the schedule with the new interval
+            cfg = load_config("interval_config", DEFAULT_INTERVAL_CONFIG)
+            self.loop_timer.start(cfg.get("interval", 10) * 60 * 1000 if cfg.get("enabled") else 60000)
+        elif name == "model_config":
+            preconnect_from_config()
+
     def eventFilter(self, obj, event):
         if obj == self.image_label:
             if event.type() == QEvent.Enter:
@@ -1480,20 +1883,35 @@ class PetWindow(QWidget):
             y = window_rect.y() - self.chat_dialog.height() - 10
             
         self.chat_dialog.move(x, y)
+        self._prewarm_chat_connection()
         self.chat_dialog.show()
         self.chat_dialog.activateWindow()
         self.chat_dialog.input_edit.setFocus()
 
+    def _prewarm_chat_connection(self):
+        # Re-open the pooled connection while the user is typing if it has gone idle.
+        mcfg = load_config("model_config", {})
+        preconnect(mcfg.get("base_url", ""), mcfg.get("api_key", ""))
+
     def _on_chat_send(self, text):
         screen = QApplication.primaryScreen()
         screen_geom = screen.availableGeometry()
         self.speech_bubble.show_message("正在思考...", self.geometry(), screen_geom.width())
         
+        # A newer message supersedes a reply that is still being generated.
+        if getattr(self, "chat_worker", None) is not None and self.chat_worker.is_running():
+            self.chat_worker.cancel()
         # Keep a reference to prevent garbage collection
         self.chat_worker = ChatWorker(text)
+        self.chat_worker.partial_signal.connect(self._on_chat_partial)
         self.chat_worker.reply_signal.connect(self._on_chat_reply)
         self.chat_worker.start()
-        
+
+    def _on_chat_partial(self, text):
+        screen = QApplication.primaryScreen()
+        screen_geom = screen.availableGeometry()
+        self.speech_bubble.stream_message(text, self.geometry(), screen_geom.width())
+
     def _on_chat_reply(self, reply):
         screen = QApplication.primaryScreen()
         screen_geom = screen.availableGeometry()
@@ -1504,6 +1922,16 @@ class PetWindow(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
+    app.aboutToQuit.connect(flush_config_store)
+    app.aboutToQuit.connect(stop_screenshot_janitor)
+    app.aboutToQuit.connect(close_sessions)
+    app.aboutToQuit.connect(close_log_writer)
+    app.aboutToQuit.connect(flush_screenshot_saver)
+    app.aboutToQuit.connect(close_capture_backend)
+    app.aboutToQuit.connect(stop_metrics)
+    start_metrics()
+    start_log_index_sync()
+    start_screenshot_janitor()
     window = PetWindow()
     window.show()
     sys.exit(app.exec_())
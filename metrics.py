@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from config_store import get_base_dir, get_config_store, load_config
+
+
+DEFAULT_METRICS_CONFIG = {
+    "enabled": False,
+    "window": 512,
+    "export": True,
+    "export_interval": 10,
+    "export_max_mb": 16,
+}
+
+
+def load_metrics_config():
+    return load_config("metrics_config", DEFAULT_METRICS_CONFIG)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Metrics:
+    # Named timers (milliseconds) and counters. Each timer keeps its last `window`
+    # samples for rolling percentiles; rates are per minute over the last minute.
+    # While disabled, timer() returns a shared no-op and observe()/count() return
+    # after one attribute check.
+    def __init__(self):
+        self.enabled = False
+        self.window = 512
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+        self._started = time.time()
+
+    def configure(self, cfg=None):
+        cfg = cfg or load_metrics_config()
+        self.window = max(16, int(cfg.get("window", 512)))
+        self.enabled = bool(cfg.get("enabled", False))
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, ms):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            series = self._series.get(name)
+            if series is None or series["samples"].maxlen != self.window:
+                old = series["samples"] if series else ()
+                series = self._series[name] = {
+                    "samples": deque(old, maxlen=self.window),
+                    "count": series["count"] if series else 0,
+                    "total": series["total"] if series else 0.0,
+                }
+            series["samples"].append((now, ms))
+            series["count"] += 1
+            series["total"] += ms
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            series = {name: (list(s["samples"]), s["count"], s["total"]) for name, s in self._series.items()}
+            counters = dict(self._counters)
+        timers = {}
+        for name, (samples, count, total) in sorted(series.items()):
+            values = sorted(ms for _, ms in samples)
+            timers[name] = {
+                "count": count,
+                "per_min": sum(1 for ts, _ in samples if now - ts <= 60),
+                "mean": total / count if count else 0.0,
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": values[-1] if values else 0.0,
+            }
+        return {"time": now, "uptime": now - self._started, "timers": timers, "counters": counters}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+            self._started = time.time()
+
+
+class MetricsExporter:
+    # Appends a snapshot to data/log/metrics.jsonl every export_interval seconds while
+    # metrics are enabled; past export_max_mb the file is moved to metrics.jsonl.1.
+    def __init__(self, metrics, path=None):
+        self.metrics = metrics
+        self.path = path or os.path.join(get_base_dir(), "data", "log", "metrics.jsonl")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+        self.export()
+
+    def _run(self):
+        while True:
+            interval = max(1.0, float(load_metrics_config().get("export_interval", 10)))
+            if self._stop.wait(interval):
+                return
+            self.export()
+
+    def export(self):
+        cfg = load_metrics_config()
+        if not self.metrics.enabled or not cfg.get("export", True):
+            return
+        snap = self.metrics.snapshot()
+        if not snap["timers"] and not snap["counters"]:
+            return
+        line = json.dumps(snap, ensure_ascii=False) + "\n"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            limit = float(cfg.get("export_max_mb", 16)) * 1024 * 1024
+            if limit > 0 and os.path.isfile(self.path) and os.path.getsize(self.path) >= limit:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except Exception as e:
+            print(str(e))
+
+
+_metrics = Metrics()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _on_config_changed(name):
+    if name == "metrics_config":
+        _metrics.configure()
+
+
+def get_metrics():
+    return _metrics
+
+
+def start_metrics():
+    global _exporter
+    _metrics.configure()
+    get_config_store().add_listener(_on_config_changed)
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = MetricsExporter(_metrics)
+        _exporter.start()
+
+
+def stop_metrics():
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.stop()
@@ -0,0 +1,164 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config_store import get_base_dir, load_config
+
+
+DEFAULT_CACHE_CONFIG = {
+    "enabled": True,
+    "max_entries": 5000,
+    "max_mb": 20,
+    "max_age_days": 30,
+}
+
+
+def load_cache_config():
+    return load_config("cache_config", DEFAULT_CACHE_CONFIG)
+
+
+def make_cache_key(image_digest, user_text, system_prompt, model, temperature):
+    raw = json.dumps([image_digest, user_text, system_prompt, model, round(float(temperature), 4)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # On-disk LRU of model replies, evicted by age, entry count and total size.
+    # Lookups only read: hit/miss counts and access times are kept in memory and
+    # written with the next put(), every FLUSH_LOOKUPS lookups and on close().
+    FLUSH_LOOKUPS = 256
+
+    def __init__(self, path=None, max_entries=5000, max_bytes=20 * 1024 * 1024, max_age_days=30):
+        self.path = path or os.path.join(get_base_dir(), "data", "cache", "result_cache.db")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+        self._touched = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, reply TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reply, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            # Expired rows are left for the next put() to evict
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self._counts["misses"] += 1
+                reply = None
+            else:
+                self._counts["hits"] += 1
+                self._touched[key] = now
+                reply = row[0]
+            if self._counts["hits"] + self._counts["misses"] >= self.FLUSH_LOOKUPS:
+                self._flush_locked()
+            return reply
+
+    def put(self, key, reply):
+        now = time.time()
+        size = len(reply.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, reply, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, reply, size, now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_locked()
+            self._evict(now)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _flush_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE entries SET accessed = ? WHERE key = ?", [(ts, key) for key, ts in self._touched.items()]
+            )
+            self._touched.clear()
+        for name, n in self._counts.items():
+            if n:
+                self._conn.execute(
+                    "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                    (name, n, n),
+                )
+                self._counts[name] = 0
+        self._conn.commit()
+
+    def _evict(self, now):
+        if self.max_age:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.max_age,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while count > self.max_entries or (self.max_bytes and total > self.max_bytes):
+            row = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            count -= 1
+            total -= row[1]
+
+    def stats(self):
+        with self._lock:
+            values = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            for name, n in self._counts.items():
+                values[name] = values.get(name, 0) + n
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits = values.get("hits", 0)
+        misses = values.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM stats")
+            self._conn.commit()
+            self._counts = {"hits": 0, "misses": 0}
+            self._touched.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _cache
+    cfg = load_cache_config()
+    if not cfg.get("enabled", True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResultCache(
+                    max_entries=int(cfg.get("max_entries", 5000)),
+                    max_bytes=int(float(cfg.get("max_mb", 20)) * 1024 * 1024),
+                    max_age_days=float(cfg.get("max_age_days", 30)),
+                )
+                atexit.register(_cache.close)
+            except Exception as e:
+                print(str(e))
+                return None
+        return _cache
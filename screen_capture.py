@@ -1,126 +1,240 @@
 import ctypes
-import os
+import threading
+from collections import OrderedDict
 from ctypes import wintypes
 from PyQt5.QtGui import QImage
 from PyQt5.QtWidgets import QApplication
+from metrics import get_metrics
+from window_index import get_window_index
 
 
-def take_window_screenshot(exe_path, file_path):
-    hwnd = find_window_by_exe_path(exe_path)
-    if hwnd is None:
-        return (False, None)
+class CaptureResult:
+    # Raw 32-bit BGRA pixels of one window capture, kept in memory so it can be
+    # encoded straight into a request payload without a trip through disk.
+    def __init__(self, buffer, width, height, stride, hwnd=None, image=None, owner=None):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.hwnd = hwnd
+        self._image = image
+        self._owner = owner
+
+    @classmethod
+    def from_qimage(cls, image, hwnd=None):
+        image = image.convertToFormat(QImage.Format_ARGB32)
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        return cls(bits, image.width(), image.height(), image.bytesPerLine(), hwnd=hwnd, image=image)
+
+    @property
+    def nbytes(self):
+        return self.stride * self.height
+
+    def to_qimage(self):
+        # Wraps the pixel buffer without copying; the result must not outlive self.
+        if self._image is not None:
+            return self._image
+        return QImage(self.buffer, self.width, self.height, self.stride, QImage.Format_ARGB32)
+
+    def save(self, file_path, fmt=None):
+        return self.to_qimage().save(file_path, fmt)
+
+    def release(self):
+        # Hands the pixel buffer back to its capture context for reuse. Any QImage
+        # from to_qimage() must be dropped first.
+        owner, buffer = self._owner, self.buffer
+        self._owner = None
+        self.buffer = None
+        self._image = None
+        if owner is not None and buffer is not None:
+            owner.return_buffer(buffer)
+
+
+def capture_window_image(hwnd):
     user32 = ctypes.windll.user32
     if user32.IsIconic(hwnd):
-        return (False, None)
-    if capture_window_to_file(hwnd, file_path):
-        return (True, file_path)
+        return None
+    capture = capture_window_to_buffer(hwnd)
+    if capture is not None:
+        return capture
     screen = QApplication.primaryScreen()
     if screen is None:
-        return (False, None)
+        return None
     pixmap = screen.grabWindow(int(hwnd))
-    ok = pixmap.save(file_path, "PNG")
-    return (bool(ok), file_path if ok else None)
+    if pixmap.isNull():
+        return None
+    return CaptureResult.from_qimage(pixmap.toImage(), hwnd=hwnd)
 
 
-def find_window_by_exe_path(exe_path):
-    target = os.path.normcase(os.path.normpath(exe_path))
-    if not target:
-        return None
-    user32 = ctypes.windll.user32
-    kernel32 = ctypes.windll.kernel32
-    hwnds = []
-    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
-
-    @ctypes.WINFUNCTYPE(ctypes.c_bool, wintypes.HWND, wintypes.LPARAM)
-    def enum_proc(hwnd, lparam):
-        if not user32.IsWindowVisible(hwnd):
-            return True
-        pid = wintypes.DWORD()
-        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-        if pid.value == 0:
-            return True
-        h_process = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
-        if not h_process:
-            return True
+def find_windows_by_exe_paths(exe_paths):
+    # Maps each exe path to the first visible top-level window of that image. Served
+    # from the cached window index; the window list is only re-enumerated on a miss.
+    return get_window_index().lookup(exe_paths)
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ("biSize", wintypes.DWORD),
+        ("biWidth", wintypes.LONG),
+        ("biHeight", wintypes.LONG),
+        ("biPlanes", wintypes.WORD),
+        ("biBitCount", wintypes.WORD),
+        ("biCompression", wintypes.DWORD),
+        ("biSizeImage", wintypes.DWORD),
+        ("biXPelsPerMeter", wintypes.LONG),
+        ("biYPelsPerMeter", wintypes.LONG),
+        ("biClrUsed", wintypes.DWORD),
+        ("biClrImportant", wintypes.DWORD),
+    ]
+
+
+class BITMAPINFO(ctypes.Structure):
+    _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", wintypes.DWORD * 3)]
+
+
+class CaptureContext:
+    # Memory DC, bitmap, BITMAPINFO and pixel buffer for one window, kept between
+    # captures and only reallocated when the window size changes.
+    PW_RENDERFULLCONTENT = 0x00000002
+
+    def __init__(self, hwnd):
+        self.hwnd = hwnd
+        self.width = 0
+        self.height = 0
+        self.memdc = None
+        self.bitmap = None
+        self.old_bitmap = None
+        self.bmi = BITMAPINFO()
+        self.bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        self.bmi.bmiHeader.biPlanes = 1
+        self.bmi.bmiHeader.biBitCount = 32
+        self.bmi.bmiHeader.biCompression = 0
+        self._free_buffer = None
+        self.lock = threading.Lock()
+
+    def _allocate(self, width, height):
+        self._release_gdi()
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        # The window DC is only needed to create compatible objects; it is a shared
+        # resource and is handed back straight away.
+        hwindc = user32.GetWindowDC(self.hwnd)
+        if not hwindc:
+            return False
         try:
-            buf_len = wintypes.DWORD(32767)
-            exe_buf = ctypes.create_unicode_buffer(buf_len.value)
-            if kernel32.QueryFullProcessImageNameW(h_process, 0, exe_buf, ctypes.byref(buf_len)):
-                candidate = os.path.normcase(os.path.normpath(exe_buf.value))
-                if candidate == target:
-                    hwnds.append(hwnd)
-                    return False
+            memdc = gdi32.CreateCompatibleDC(hwindc)
+            if not memdc:
+                return False
+            bitmap = gdi32.CreateCompatibleBitmap(hwindc, width, height)
+            if not bitmap:
+                gdi32.DeleteDC(memdc)
+                return False
         finally:
-            kernel32.CloseHandle(h_process)
+            user32.ReleaseDC(self.hwnd, hwindc)
+        self.memdc = memdc
+        self.bitmap = bitmap
+        self.old_bitmap = gdi32.SelectObject(memdc, bitmap)
+        self.width = width
+        self.height = height
+        self.bmi.bmiHeader.biWidth = width
+        self.bmi.bmiHeader.biHeight = -height
+        if self._free_buffer is not None and len(self._free_buffer) != width * height * 4:
+            self._free_buffer = None
         return True
 
-    user32.EnumWindows(enum_proc, 0)
-    return hwnds[0] if hwnds else None
+    def capture(self):
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        rect = wintypes.RECT()
+        if not user32.GetWindowRect(self.hwnd, ctypes.byref(rect)):
+            return None
+        width = rect.right - rect.left
+        height = rect.bottom - rect.top
+        if width <= 0 or height <= 0:
+            return None
+        with self.lock:
+            if self.memdc is None or (width, height) != (self.width, self.height):
+                if not self._allocate(width, height):
+                    self._release_gdi()
+                    return None
+            with get_metrics().timer("capture.print_window"):
+                if not user32.PrintWindow(self.hwnd, self.memdc, self.PW_RENDERFULLCONTENT):
+                    return None
+            # A buffer still held by an earlier CaptureResult is never overwritten.
+            buffer = self._free_buffer
+            self._free_buffer = None
+            if buffer is None:
+                buffer = ctypes.create_string_buffer(width * height * 4)
+            bits = gdi32.GetDIBits(self.memdc, self.bitmap, 0, height, buffer, ctypes.byref(self.bmi), 0)
+            if bits == 0:
+                self._free_buffer = buffer
+                return None
+            return CaptureResult(buffer, width, height, width * 4, hwnd=self.hwnd, owner=self)
 
+    def return_buffer(self, buffer):
+        with self.lock:
+            if len(buffer) == self.width * self.height * 4:
+                self._free_buffer = buffer
 
-def capture_window_to_file(hwnd, file_path):
-    user32 = ctypes.windll.user32
-    gdi32 = ctypes.windll.gdi32
-    rect = wintypes.RECT()
-    if not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
-        return False
-    width = rect.right - rect.left
-    height = rect.bottom - rect.top
-    if width <= 0 or height <= 0:
-        return False
-    hwindc = user32.GetWindowDC(hwnd)
-    if not hwindc:
-        return False
-    memdc = gdi32.CreateCompatibleDC(hwindc)
-    if not memdc:
-        user32.ReleaseDC(hwnd, hwindc)
-        return False
-    bitmap = gdi32.CreateCompatibleBitmap(hwindc, width, height)
-    if not bitmap:
-        gdi32.DeleteDC(memdc)
-        user32.ReleaseDC(hwnd, hwindc)
-        return False
-    gdi32.SelectObject(memdc, bitmap)
-    PW_RENDERFULLCONTENT = 0x00000002
-    printed = user32.PrintWindow(hwnd, memdc, PW_RENDERFULLCONTENT)
-    if not printed:
-        gdi32.DeleteObject(bitmap)
-        gdi32.DeleteDC(memdc)
-        user32.ReleaseDC(hwnd, hwindc)
-        return False
-
-    class BITMAPINFOHEADER(ctypes.Structure):
-        _fields_ = [
-            ("biSize", wintypes.DWORD),
-            ("biWidth", wintypes.LONG),
-            ("biHeight", wintypes.LONG),
-            ("biPlanes", wintypes.WORD),
-            ("biBitCount", wintypes.WORD),
-            ("biCompression", wintypes.DWORD),
-            ("biSizeImage", wintypes.DWORD),
-            ("biXPelsPerMeter", wintypes.LONG),
-            ("biYPelsPerMeter", wintypes.LONG),
-            ("biClrUsed", wintypes.DWORD),
-            ("biClrImportant", wintypes.DWORD),
-        ]
-
-    class BITMAPINFO(ctypes.Structure):
-        _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", wintypes.DWORD * 3)]
-
-    bmi = BITMAPINFO()
-    bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
-    bmi.bmiHeader.biWidth = width
-    bmi.bmiHeader.biHeight = -height
-    bmi.bmiHeader.biPlanes = 1
-    bmi.bmiHeader.biBitCount = 32
-    bmi.bmiHeader.biCompression = 0
-    buffer_size = width * height * 4
-    buffer = ctypes.create_string_buffer(buffer_size)
-    bits = gdi32.GetDIBits(memdc, bitmap, 0, height, buffer, ctypes.byref(bmi), 0)
-    gdi32.DeleteObject(bitmap)
-    gdi32.DeleteDC(memdc)
-    user32.ReleaseDC(hwnd, hwindc)
-    if bits == 0:
-        return False
-    image = QImage(buffer, width, height, width * 4, QImage.Format_ARGB32)
-    return image.save(file_path)
+    def _release_gdi(self):
+        gdi32 = ctypes.windll.gdi32
+        if self.memdc:
+            if self.old_bitmap:
+                gdi32.SelectObject(self.memdc, self.old_bitmap)
+            gdi32.DeleteDC(self.memdc)
+        if self.bitmap:
+            gdi32.DeleteObject(self.bitmap)
+        self.memdc = None
+        self.bitmap = None
+        self.old_bitmap = None
+        self.width = 0
+        self.height = 0
+
+    def close(self):
+        with self.lock:
+            self._release_gdi()
+            self._free_buffer = None
+
+
+_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+MAX_CAPTURE_CONTEXTS = 16
+
+
+def _get_capture_context(hwnd):
+    key = int(hwnd)
+    evicted = []
+    with _contexts_lock:
+        ctx = _contexts.get(key)
+        if ctx is None:
+            ctx = CaptureContext(hwnd)
+            _contexts[key] = ctx
+        _contexts.move_to_end(key)
+        while len(_contexts) > MAX_CAPTURE_CONTEXTS:
+            evicted.append(_contexts.popitem(last=False)[1])
+    for old in evicted:
+        old.close()
+    return ctx
+
+
+def _drop_capture_context(hwnd):
+    with _contexts_lock:
+        ctx = _contexts.pop(int(hwnd), None)
+    if ctx is not None:
+        ctx.close()
+
+
+def release_capture_contexts():
+    with _contexts_lock:
+        contexts = list(_contexts.values())
+        _contexts.clear()
+    for ctx in contexts:
+        ctx.close()
+
+
+def capture_window_to_buffer(hwnd):
+    if not ctypes.windll.user32.IsWindow(hwnd):
+        _drop_capture_context(hwnd)
+        return None
+    return _get_capture_context(hwnd).capture()
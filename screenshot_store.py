@@ -0,0 +1,544 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config_store import get_base_dir, load_config
+
+
+def screenshot_dir():
+    return os.path.join(get_base_dir(), "data", "screenshot")
+
+
+def blob_dir():
+    return os.path.join(get_base_dir(), "data", "screenshot_blobs")
+
+
+def screenshot_path(app_name, ext="png", ts=None):
+    ts = time.time() if ts is None else ts
+    date_folder = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+    base_dir = os.path.join(screenshot_dir(), app_name, date_folder)
+    return os.path.join(base_dir, f"{app_name}-{int(ts)}.{ext}")
+
+
+DEFAULT_RETENTION_CONFIG = {
+    "enabled": True,
+    "max_age_days": 30,
+    "max_total_mb": 2048,
+    "max_app_mb": 512,
+    "thin_after_days": 3,
+    "keep_every_nth": 10,
+    "janitor_interval": 600,
+    "batch": 200,
+}
+
+
+def load_retention_config():
+    return load_config("retention_config", DEFAULT_RETENTION_CONFIG)
+
+
+class ScreenshotIndex:
+    # One row per screenshot file (app, day, ts, size) so quotas and age limits are
+    # answered by SQL instead of walking data/screenshot. The saver adds rows as it
+    # writes; the tree is scanned once, the first time the index is opened.
+    #
+    # It is also the manifest of the content-addressed blob store: each screenshot
+    # row names the sha256 blob it is a hard link to, and blobs carry a reference
+    # count so a blob is only deleted with its last screenshot. Rows with no blob
+    # are plain files (written before the blob store, or where links fail).
+    def __init__(self, path=None, root=None, blob_root=None):
+        self.path = path or os.path.join(get_base_dir(), "data", "cache", "screenshots.db")
+        self.root = root or screenshot_dir()
+        self.blob_root = blob_root or blob_dir()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shots ("
+            "path TEXT PRIMARY KEY, app TEXT NOT NULL, day TEXT NOT NULL, ts REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(shots)")]
+        if "blob" not in columns:
+            self._conn.execute("ALTER TABLE shots ADD COLUMN blob TEXT")
+        if "keep" not in columns:
+            self._conn.execute("ALTER TABLE shots ADD COLUMN keep INTEGER NOT NULL DEFAULT 0")
+        if "retry_after" not in columns:
+            # Files the janitor failed to delete are left alone until retry_after
+            self._conn.execute("ALTER TABLE shots ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE shots ADD COLUMN retry_after REAL NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "hash TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, refs INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shots_blob ON shots(blob)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shots_ts ON shots(ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shots_app_ts ON shots(app, ts)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS thinned (app TEXT NOT NULL, day TEXT NOT NULL, PRIMARY KEY (app, day))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        if not self._conn.execute("SELECT value FROM meta WHERE name = 'scanned'").fetchone():
+            self.rescan()
+
+    def _row_for(self, file_path, size=None, ts=None):
+        rel = os.path.relpath(file_path, self.root)
+        parts = rel.split(os.sep)
+        app = parts[0] if len(parts) >= 3 else ""
+        day = parts[1] if len(parts) >= 3 else ""
+        if ts is None:
+            stem = os.path.splitext(parts[-1])[0]
+            try:
+                ts = float(stem.rsplit("-", 1)[1])
+            except (IndexError, ValueError):
+                ts = os.path.getmtime(file_path)
+        if size is None:
+            size = os.path.getsize(file_path)
+        return (rel, app, day, float(ts), int(size))
+
+    def rescan(self):
+        rows = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    rows.append(self._row_for(os.path.join(dirpath, name)))
+                except OSError:
+                    continue
+        with self._lock:
+            self._conn.execute("DELETE FROM shots")
+            self._conn.executemany("INSERT OR REPLACE INTO shots (path, app, day, ts, size) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('scanned', ?)", (str(time.time()),))
+            self._conn.commit()
+
+    def add(self, file_path, size, ts=None, blob=None):
+        row = self._row_for(file_path, size, ts) + (blob,)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO shots (path, app, day, ts, size, blob) VALUES (?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+
+    def acquire_blob(self, digest, rel_path, size):
+        # Takes a reference on a blob; returns its stored path and whether it already
+        # existed (in which case nothing needs to be written).
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row:
+                self._conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (digest,))
+            else:
+                self._conn.execute("INSERT INTO blobs (hash, path, size, refs) VALUES (?, ?, ?, 1)", (digest, rel_path, size))
+            self._conn.commit()
+        return (row[0] if row else rel_path), bool(row)
+
+    def _release_locked(self, digest):
+        # Drops one reference; returns (blob path, size) when it was the last one.
+        row = self._conn.execute("SELECT path, size, refs FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if not row:
+            return None
+        if row[2] <= 1:
+            self._conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            return (row[0], row[1])
+        self._conn.execute("UPDATE blobs SET refs = refs - 1 WHERE hash = ?", (digest,))
+        return None
+
+    def release_blob(self, digest):
+        with self._lock:
+            orphan = self._release_locked(digest)
+            self._conn.commit()
+        return orphan
+
+    def remove(self, rel_paths):
+        # Forgets the given screenshots and returns what that frees on disk:
+        # [(blob path or None, size)] for orphaned blobs and plain files.
+        freed = []
+        with self._lock:
+            for rel in rel_paths:
+                row = self._conn.execute("SELECT size, blob FROM shots WHERE path = ?", (rel,)).fetchone()
+                if not row:
+                    continue
+                self._conn.execute("DELETE FROM shots WHERE path = ?", (rel,))
+                if row[1] is None:
+                    freed.append((None, row[0]))
+                else:
+                    orphan = self._release_locked(row[1])
+                    if orphan:
+                        freed.append(orphan)
+            self._conn.commit()
+        return freed
+
+    def totals(self):
+        # bytes is what is actually on disk: each blob once plus plain files.
+        with self._lock:
+            count, logical = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM shots").fetchone()
+            plain = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM shots WHERE blob IS NULL").fetchone()[0]
+            blobs, blob_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"files": count, "logical_bytes": logical, "bytes": plain + blob_bytes, "blobs": blobs}
+
+    def app_sizes(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT app, SUM(size) FROM shots GROUP BY app").fetchall())
+
+    def defer(self, rel_paths, delay, max_delay):
+        # Backs off from files that could not be deleted: delay seconds after the first
+        # failure, doubling with each further one up to max_delay.
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE shots SET retry_after = ? + MIN(?, ? * (1 << MIN(failures, 20))), failures = failures + 1 WHERE path = ?",
+                [(now, max_delay, delay, rel) for rel in rel_paths],
+            )
+            self._conn.commit()
+
+    def older_than(self, ts, limit):
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT path FROM shots WHERE ts < ? AND retry_after <= ? ORDER BY ts LIMIT ?", (ts, time.time(), limit)
+            )]
+
+    def oldest(self, limit, app=None):
+        sql = "SELECT path, size FROM shots WHERE retry_after <= ?"
+        params = [time.time()]
+        if app is not None:
+            sql += " AND app = ?"
+            params.append(app)
+        sql += " ORDER BY ts LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def unthinned_days(self, before_day):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT DISTINCT s.app, s.day FROM shots s LEFT JOIN thinned t ON t.app = s.app AND t.day = s.day "
+                "WHERE s.day < ? AND t.day IS NULL ORDER BY s.day", (before_day,)
+            ).fetchall()
+
+    def thin_candidates(self, app, day, nth):
+        # The shots to keep (every nth by time) are chosen the first time a day is
+        # thinned and marked, so a day thinned over several batch-limited passes
+        # always keeps the same ones. Returns the rest.
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM shots WHERE app = ? AND day = ? AND keep = 1 LIMIT 1", (app, day)).fetchone():
+                paths = [r[0] for r in self._conn.execute("SELECT path FROM shots WHERE app = ? AND day = ? ORDER BY ts, path", (app, day))]
+                self._conn.executemany("UPDATE shots SET keep = 1 WHERE path = ?", [(p,) for p in paths[::nth]])
+                self._conn.commit()
+            return [r[0] for r in self._conn.execute(
+                "SELECT path FROM shots WHERE app = ? AND day = ? AND keep = 0 AND retry_after <= ? ORDER BY ts", (app, day, time.time())
+            )]
+
+    def mark_thinned(self, app, day):
+        # Only once every dropped shot is gone; a day with deferred deletions is revisited.
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO thinned (app, day) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM shots WHERE app = ? AND day = ? AND keep = 0)",
+                (app, day, app, day),
+            )
+            self._conn.commit()
+
+    def all_paths(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT path FROM shots ORDER BY ts")]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM shots")
+            self._conn.execute("DELETE FROM thinned")
+            self._conn.execute("DELETE FROM blobs")
+            self._conn.commit()
+
+
+class RetentionJanitor:
+    # Enforces retention_config on a background thread: maximum age, keep every Nth
+    # screenshot of days older than thin_after_days, a per-app size quota and a
+    # total size quota (oldest first). Each pass removes at most `batch` files. A file
+    # that cannot be deleted (locked, no permission) is skipped with a growing back-off
+    # instead of being retried on every pass.
+    RETRY_DELAY = 60
+    RETRY_MAX_DELAY = 86400
+
+    def __init__(self, index=None):
+        self.index = index
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"passes": 0, "deleted": 0, "freed": 0, "failed": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="screenshot-janitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        # The first scan of an existing tree happens here, not on the UI thread
+        if self.index is None:
+            self.index = get_screenshot_index()
+        while not self._stop.is_set():
+            cfg = load_retention_config()
+            more = False
+            if cfg.get("enabled", True):
+                try:
+                    more = self.run_once(cfg)
+                except Exception as e:
+                    print(str(e))
+            # Keep going in short steps while over budget, otherwise sleep
+            delay = 0.2 if more else float(cfg.get("janitor_interval", 600))
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _delete(self, rel_paths):
+        # Returns the bytes actually freed; a view whose blob is still referenced by
+        # other screenshots frees nothing.
+        removed = []
+        failed = []
+        for rel in rel_paths:
+            full = os.path.join(self.index.root, rel)
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(str(e))
+                failed.append(rel)
+                continue
+            removed.append(rel)
+            _prune_dirs(os.path.dirname(full), self.index.root)
+        if failed:
+            self.index.defer(failed, self.RETRY_DELAY, self.RETRY_MAX_DELAY)
+            self.stats["failed"] += len(failed)
+        freed = 0
+        for blob_rel, size in self.index.remove(removed):
+            freed += size
+            if blob_rel is not None:
+                _remove_blob(self.index, blob_rel)
+        self.stats["deleted"] += len(removed)
+        self.stats["freed"] += freed
+        return freed
+
+    def run_once(self, cfg=None):
+        # Returns True when there is still work left for another pass.
+        cfg = cfg or load_retention_config()
+        batch = max(1, int(cfg.get("batch", 200)))
+        self.stats["passes"] += 1
+        budget = batch
+
+        max_age = float(cfg.get("max_age_days", 0) or 0)
+        if max_age > 0:
+            expired = self.index.older_than(time.time() - max_age * 86400, budget)
+            self._delete(expired)
+            budget -= len(expired)
+            if budget <= 0:
+                return True
+
+        nth = int(cfg.get("keep_every_nth", 0) or 0)
+        thin_after = float(cfg.get("thin_after_days", 0) or 0)
+        if nth > 1 and thin_after > 0:
+            before_day = datetime.fromtimestamp(time.time() - thin_after * 86400).strftime("%Y-%m-%d")
+            for app, day in self.index.unthinned_days(before_day):
+                drop = self.index.thin_candidates(app, day, nth)
+                if len(drop) > budget:
+                    self._delete(drop[:budget])
+                    return True
+                self._delete(drop)
+                self.index.mark_thinned(app, day)
+                budget -= len(drop)
+                if budget <= 0:
+                    return True
+
+        max_app = float(cfg.get("max_app_mb", 0) or 0) * 1024 * 1024
+        if max_app > 0:
+            for app, size in self.index.app_sizes().items():
+                over = size - max_app
+                if over <= 0:
+                    continue
+                victims = []
+                for rel, s in self.index.oldest(budget, app=app):
+                    if over <= 0:
+                        break
+                    victims.append(rel)
+                    over -= s
+                if not victims:
+                    # Only deferred files left over the quota
+                    continue
+                self._delete(victims)
+                budget -= len(victims)
+                if budget <= 0 or over > 0:
+                    return True
+
+        max_total = float(cfg.get("max_total_mb", 0) or 0) * 1024 * 1024
+        if max_total > 0:
+            over = self.index.totals()["bytes"] - max_total
+            victims = self.index.oldest(budget) if over > 0 else []
+            for rel, _ in victims:
+                over -= self._delete([rel])
+                if over <= 0:
+                    break
+            return over > 0 and bool(victims)
+        return False
+
+
+def _prune_dirs(path, stop):
+    # Removes empty folders from path upwards, never stop itself.
+    stop = os.path.abspath(stop)
+    path = os.path.abspath(path)
+    while path != stop and path.startswith(stop):
+        try:
+            os.rmdir(path)
+        except OSError:
+            break
+        path = os.path.dirname(path)
+
+
+def _remove_blob(index, blob_rel):
+    full = os.path.join(index.blob_root, blob_rel)
+    try:
+        os.remove(full)
+    except OSError:
+        pass
+    _prune_dirs(os.path.dirname(full), index.blob_root)
+
+
+def clear_screenshots(progress=None):
+    # Deletes every screenshot, reporting progress(done, total) as it goes; meant to
+    # be run off the UI thread.
+    index = get_screenshot_index()
+    flush_screenshot_saver()
+    paths = index.all_paths()
+    total = len(paths)
+    done = 0
+    for start in range(0, total, 100):
+        chunk = paths[start:start + 100]
+        for rel in chunk:
+            try:
+                os.remove(os.path.join(index.root, rel))
+            except OSError:
+                pass
+        for blob_rel, _ in index.remove(chunk):
+            if blob_rel is not None:
+                _remove_blob(index, blob_rel)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    # Anything the index did not know about, plus the now empty folders
+    for root in (index.root, index.blob_root):
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            for name in filenames:
+                try:
+                    os.remove(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+            if dirpath != root:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+    index.clear()
+    return total
+
+
+class ScreenshotSaver:
+    # Writes already-encoded screenshots on a background thread so the capture cycle
+    # never waits on file I/O. Content is stored once per sha256 under
+    # data/screenshot_blobs; the usual data/screenshot/<app>/<date>/ file is a hard
+    # link to it, so a frame identical to an earlier one costs no data write.
+    def __init__(self, max_pending=16):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.stats = {"saved": 0, "deduplicated": 0}
+        self._thread = threading.Thread(target=self._run, name="screenshot-saver", daemon=True)
+        self._thread.start()
+
+    def save(self, data, file_path, digest=None):
+        self._queue.put((data, file_path, digest))
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            data, file_path, digest = self._queue.get()
+            try:
+                self._store(data, file_path, digest or hashlib.sha256(data).hexdigest())
+            except Exception as e:
+                print(str(e))
+            finally:
+                self._queue.task_done()
+
+    def _store(self, data, file_path, digest):
+        index = get_screenshot_index()
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if os.path.lexists(file_path):
+            # Same app and second as an existing shot: replace it
+            os.remove(file_path)
+            for blob_rel, _ in index.remove([os.path.relpath(file_path, index.root)]):
+                if blob_rel is not None:
+                    _remove_blob(index, blob_rel)
+        ext = os.path.splitext(file_path)[1]
+        blob_rel, existed = index.acquire_blob(digest, os.path.join(digest[:2], digest + ext), len(data))
+        blob_path = os.path.join(index.blob_root, blob_rel)
+        try:
+            if not existed:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp = blob_path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, blob_path)
+            os.link(blob_path, file_path)
+        except OSError:
+            # No hard links here (or the blob went missing): keep a plain file instead
+            orphan = index.release_blob(digest)
+            if orphan:
+                _remove_blob(index, orphan[0])
+            with open(file_path, "wb") as f:
+                f.write(data)
+            index.add(file_path, len(data))
+            self.stats["saved"] += 1
+            return
+        index.add(file_path, len(data), blob=digest)
+        self.stats["saved"] += 1
+        if existed:
+            self.stats["deduplicated"] += 1
+
+
+_saver = None
+_saver_lock = threading.Lock()
+_index = None
+_janitor = None
+_index_lock = threading.Lock()
+
+
+def get_screenshot_saver():
+    global _saver
+    with _saver_lock:
+        if _saver is None:
+            _saver = ScreenshotSaver()
+        return _saver
+
+
+def flush_screenshot_saver():
+    if _saver is not None:
+        _saver.flush()
+
+
+def get_screenshot_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ScreenshotIndex()
+        return _index
+
+
+def start_screenshot_janitor():
+    global _janitor
+    with _index_lock:
+        if _janitor is None:
+            _janitor = RetentionJanitor()
+            _janitor.start()
+        return _janitor
+
+
+def stop_screenshot_janitor():
+    if _janitor is not None:
+        _janitor.stop()
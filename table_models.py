@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from log_store import read_log_entries
+
+
+class LogSearchSource:
+    # Call-log rows matching an index search, loaded a page of ids at a time as the
+    # view scrolls (fetch_more) instead of every match up front. total is the number
+    # of matches, counted no further than COUNT_CAP. Rows are located when fetched, so
+    # they stay readable after the live file is rotated into a compressed segment.
+    PAGE = 500
+    COUNT_CAP = 10000
+
+    def __init__(self, index, text="", model=None, start_ts=None, end_ts=None):
+        self.index = index
+        self.filters = {"text": text, "model": model, "start_ts": start_ts, "end_ts": end_ts}
+        self.ids = []
+        self.exhausted = False
+        self.total = index.count_matches(cap=self.COUNT_CAP, **self.filters)
+        self.fetch_more()
+
+    def count(self):
+        return len(self.ids)
+
+    def can_fetch_more(self):
+        return not self.exhausted
+
+    def fetch_more(self):
+        ids = self.index.search_ids(after_id=self.ids[-1] if self.ids else None, limit=self.PAGE, **self.filters)
+        self.ids.extend(ids)
+        self.exhausted = len(ids) < self.PAGE
+        if self.exhausted:
+            self.total = max(self.total, len(self.ids))
+        return len(ids)
+
+    def fetch(self, start, count):
+        locations = self.index.locations(self.ids[start:start + count])
+        found = [loc for loc in locations if loc is not None]
+        entries = iter(read_log_entries(found, self.index.log_dir))
+        return [next(entries) if loc is not None else {} for loc in locations]
+
+    def refresh(self):
+        if self.ids and self.index.locations(self.ids[:1])[0] is None:
+            # The oldest segment was dropped by the size cap
+            self.ids = []
+            self.total = self.index.count_matches(cap=self.COUNT_CAP, **self.filters)
+            self.fetch_more()
+            return True, 0
+        if not self.exhausted:
+            # New rows come in through fetch_more once the view scrolls down to them
+            return False, 0
+        total = self.total
+        added = self.fetch_more()
+        self.total = max(total + added, len(self.ids))
+        return False, added
+
+
+class BehaviorSource:
+    def __init__(self, store):
+        self.store = store
+        self._first, self._count = self._range()
+
+    def _range(self):
+        first, last = self.store.id_range()
+        return first, 0 if first is None else last - first + 1
+
+    def count(self):
+        return self._count
+
+    def fetch(self, start, count):
+        if self._first is None:
+            return []
+        return self.store.rows(self._first + start - 1, count)
+
+    def refresh(self):
+        first, count = self._range()
+        reset = count < self._count or (self._first is not None and first != self._first)
+        added = 0 if reset else count - self._count
+        self._first, self._count = first, count
+        return reset, added
+
+
+class LazyTableModel(QAbstractTableModel):
+    # Read-only table that fetches rows from its source in blocks on demand and keeps
+    # only a bounded number of them in memory.
+    BLOCK = 64
+    CACHE_ROWS = 2048
+    MAX_CELL_CHARS = 300
+
+    def __init__(self, columns, source=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.source = source
+        self._rows = 0 if source is None else source.count()
+        self._cache = OrderedDict()
+
+    def set_source(self, source):
+        self.beginResetModel()
+        self.source = source
+        self._rows = 0 if source is None else source.count()
+        self._cache.clear()
+        self.endResetModel()
+
+    def refresh(self):
+        # Picks up rows appended to the source without repopulating the view.
+        if self.source is None:
+            return 0
+        reset, added = self.source.refresh()
+        if reset:
+            self.beginResetModel()
+            self._rows = self.source.count()
+            self._cache.clear()
+            self.endResetModel()
+            return self._rows
+        if added:
+            self.beginInsertRows(QModelIndex(), self._rows, self._rows + added - 1)
+            self._rows += added
+            self.endInsertRows()
+        return added
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.source is not None and getattr(self.source, "can_fetch_more", bool)()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        added = self.source.fetch_more()
+        if added:
+            self.beginInsertRows(QModelIndex(), self._rows, self._rows + added - 1)
+            self._rows += added
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return None
+
+    def entry(self, row):
+        if row < 0 or row >= self._rows:
+            return {}
+        entry = self._cache.get(row)
+        if entry is not None:
+            self._cache.move_to_end(row)
+            return entry
+        start = row - row % self.BLOCK
+        block = self.source.fetch(start, min(self.BLOCK, self._rows - start))
+        for i, e in enumerate(block):
+            self._cache[start + i] = e
+        while len(self._cache) > self.CACHE_ROWS:
+            self._cache.popitem(last=False)
+        return self._cache.get(row, {})
+
+    def cell_text(self, row, col):
+        return self.columns[col][1](self.entry(row))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        text = self.cell_text(index.row(), index.column())
+        if len(text) > self.MAX_CELL_CHARS:
+            text = text[:self.MAX_CELL_CHARS] + "…"
+        return text
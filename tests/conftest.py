@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Stores created without an explicit path land in a scratch folder, not the real data/
+os.environ["SCREENGUARDIAN_BASE_DIR"] = tempfile.mkdtemp(prefix="screenguardian-tests-")
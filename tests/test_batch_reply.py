@@ -0,0 +1,35 @@
+from ai_chat import parse_batch_reply
+
+
+def test_object_with_results():
+    reply = '{"results": [{"id": 1, "behavior": "写代码"}, {"id": 2, "behavior": "看视频"}]}'
+    assert parse_batch_reply(reply) == {1: "写代码", 2: "看视频"}
+
+
+def test_bare_array():
+    reply = '[{"id": 1, "behavior": "写代码"}, {"id": 2, "behavior": "看视频"}]'
+    assert parse_batch_reply(reply) == {1: "写代码", 2: "看视频"}
+
+
+def test_fenced_code_with_text_around():
+    reply = '结果如下：\n```json\n{"results": [{"id": 1, "behavior": "写代码"}]}\n```\n以上。'
+    assert parse_batch_reply(reply) == {1: "写代码"}
+
+
+def test_fenced_bare_array():
+    reply = '```json\n[{"id": 3, "behavior": "聊天"}]\n```'
+    assert parse_batch_reply(reply) == {3: "聊天"}
+
+
+def test_id_keyed_object():
+    assert parse_batch_reply('{"1": "写代码", "2": "看视频"}') == {1: "写代码", 2: "看视频"}
+
+
+def test_brackets_before_the_json_are_skipped():
+    reply = '[图片1] 与 [图片2] 的分析：{"results": [{"id": 1, "behavior": "写代码"}]}'
+    assert parse_batch_reply(reply) == {1: "写代码"}
+
+
+def test_unparseable_reply():
+    assert parse_batch_reply("无法分析这些图片") == {}
+    assert parse_batch_reply('{"results": [') == {}
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from behavior_summary import BehaviorSummary
+
+
+def _today(hour, minute):
+    now = datetime.now()
+    return datetime(now.year, now.month, now.day, hour, minute).timestamp()
+
+
+def _rounds(summary, start, minutes, entries):
+    for m in minutes:
+        summary.update(entries, start + m * 60)
+
+
+def test_foreground_minutes_sessions_and_streak(tmp_path):
+    summary = BehaviorSummary(path=str(tmp_path / "summary.json"))
+    start = _today(9, 0)
+    _rounds(summary, start, range(0, 11), [
+        {"app": "IDEA", "behavior": "写代码", "foreground": True},
+        {"app": "微信", "behavior": "聊天", "foreground": False},
+    ])
+    # A break longer than max_gap_minutes starts a new session
+    _rounds(summary, start, range(60, 66), [{"app": "IDEA", "behavior": "调试接口", "foreground": True}])
+
+    state = summary._state
+    idea = state["apps"]["IDEA"]
+    assert round(idea["minutes"]) == 15
+    assert idea["sessions"] == 2
+    assert round(idea["streak"]) == 5
+    assert idea["recent"] == ["写代码", "调试接口"]
+    assert state["apps"]["微信"]["minutes"] == 0
+    text = summary.text()
+    assert "IDEA：前台累计约 15 分钟，2 段使用，当前已连续 5 分钟；最近：写代码；调试接口" in text
+    assert "微信：仅在后台运行；最近：聊天" in text
+
+
+def test_save_and_reload(tmp_path):
+    path = str(tmp_path / "summary.json")
+    summary = BehaviorSummary(path=path)
+    summary.update([{"app": "IDEA", "behavior": "写代码", "foreground": True}], time.time())
+    summary.save()
+    assert BehaviorSummary(path=path).text() == summary.text()
+    summary.reset()
+    assert BehaviorSummary(path=path).is_empty()
+
+
+def test_rebuild_groups_entries_into_rounds(tmp_path):
+    summary = BehaviorSummary(path=str(tmp_path / "summary.json"))
+    start = _today(9, 0)
+    entries = []
+    for m in range(0, 6):
+        ts = start + m * 60
+        entries.append({"ts": ts, "app": "Chrome", "behavior": "看文档", "foreground": True})
+        entries.append({"ts": ts, "app": "IDEA", "behavior": "写代码", "foreground": False})
+    summary.rebuild(entries)
+    assert round(summary._state["apps"]["Chrome"]["minutes"]) == 5
+    assert summary._state["apps"]["IDEA"]["sessions"] == 0
+    assert summary._state["last_apps"] == ["Chrome"]
@@ -0,0 +1,56 @@
+import asyncio
+
+from chat_memory import ChatMemory, clip_tokens, estimate_tokens
+
+
+def test_token_estimate_and_clip():
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    clipped = clip_tokens("字" * 100, 10)
+    assert clipped == "字" * 10 + "…"
+    assert clip_tokens("短", 10) == "短"
+
+
+def test_turns_persist_across_instances(tmp_path):
+    path = str(tmp_path / "memory.json")
+    memory = ChatMemory(path=path)
+    memory.add_turn("你好", "你好呀")
+    reloaded = ChatMemory(path=path)
+    assert reloaded.messages() == [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "你好呀"}]
+    reloaded.clear()
+    assert ChatMemory(path=path).messages() == []
+
+
+def test_compact_folds_old_turns_into_the_summary(tmp_path):
+    memory = ChatMemory(path=str(tmp_path / "memory.json"))
+    for i in range(10):
+        memory.add_turn(f"第{i}个问题" + "问" * 200, f"第{i}个回答" + "答" * 200)
+    seen = []
+
+    async def summarize(previous, turns):
+        seen.append((previous, len(turns)))
+        return "用户问了很多问题"
+
+    assert asyncio.run(memory.compact(summarize))
+    messages = memory.messages()
+    assert messages[0] == {"role": "system", "content": "此前对话的摘要：用户问了很多问题"}
+    turns = messages[1:]
+    assert len(turns) % 2 == 0 and turns[0]["role"] == "user"
+    assert turns[-1]["content"].startswith("第9个回答")
+    assert sum(estimate_tokens(t["content"]) for t in turns) <= 1500
+    assert seen == [("", 20 - len(turns))]
+    assert not asyncio.run(memory.compact(summarize))
+
+
+def test_failed_summary_still_drops_overflow(tmp_path):
+    memory = ChatMemory(path=str(tmp_path / "memory.json"))
+    for i in range(10):
+        memory.add_turn(f"第{i}个问题" + "问" * 200, f"第{i}个回答" + "答" * 200)
+
+    async def summarize(previous, turns):
+        raise RuntimeError("offline")
+
+    assert asyncio.run(memory.compact(summarize))
+    summary = memory.summary
+    assert summary and estimate_tokens(summary) <= 400
+    assert sum(estimate_tokens(t["content"]) for t in memory.turns) <= 1500
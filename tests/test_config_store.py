@@ -0,0 +1,55 @@
+import json
+import os
+
+from config_store import ConfigStore
+
+
+def _write(store, name, data, mtime):
+    with open(store.path(name), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.utime(store.path(name), (mtime, mtime))
+
+
+def test_defaults_are_overlaid_with_the_file(tmp_path):
+    store = ConfigStore(config_dir=str(tmp_path), check_interval=0)
+    defaults = {"enabled": True, "limit": 5}
+    assert store.get("demo", defaults) == defaults
+    _write(store, "demo", {"limit": 9}, 1_000_000)
+    assert store.get("demo", defaults) == {"enabled": True, "limit": 9}
+    # Callers get copies
+    store.get("demo", defaults)["limit"] = 1
+    assert store.get("demo")["limit"] == 9
+
+
+def test_writes_are_batched_until_flush(tmp_path):
+    store = ConfigStore(config_dir=str(tmp_path), write_delay=60)
+    store.set("demo", {"a": 1})
+    store.update("demo", {"b": 2})
+    assert store.get("demo") == {"a": 1, "b": 2}
+    assert not os.path.exists(store.path("demo"))
+    store.flush()
+    with open(store.path("demo"), encoding="utf-8") as f:
+        assert json.load(f) == {"a": 1, "b": 2}
+    assert [n for n in os.listdir(tmp_path) if n.endswith(".tmp")] == []
+
+
+def test_external_edit_reloads_and_notifies(tmp_path):
+    store = ConfigStore(config_dir=str(tmp_path), check_interval=0)
+    _write(store, "demo", {"a": 1}, 1_000_000)
+    assert store.get("demo") == {"a": 1}
+    reloaded = []
+    store.add_listener(reloaded.append)
+    _write(store, "demo", {"a": 2}, 1_000_100)
+    assert store.poll() == ["demo"]
+    assert reloaded == ["demo"]
+    assert store.get("demo") == {"a": 2}
+
+
+def test_invalid_file_keeps_last_good_copy(tmp_path):
+    store = ConfigStore(config_dir=str(tmp_path), check_interval=0)
+    _write(store, "demo", {"a": 1}, 1_000_000)
+    assert store.get("demo") == {"a": 1}
+    with open(store.path("demo"), "w", encoding="utf-8") as f:
+        f.write("{\"a\": ")
+    os.utime(store.path("demo"), (1_000_100, 1_000_100))
+    assert store.get("demo") == {"a": 1}
@@ -0,0 +1,114 @@
+import json
+import os
+from datetime import datetime
+
+from log_index import LogIndex
+from log_store import read_log_entries, rotate_log
+
+
+def _append(log_dir, entries):
+    with open(os.path.join(log_dir, "logs.jsonl"), "a", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+
+def _entry(i, reply, model="qwen-vl-plus"):
+    return {
+        "time": datetime(2026, 10, 1, 9, 0, i % 60).isoformat(timespec="seconds"),
+        "model": model,
+        "user_input_content": f"描述用户正在做什么 #{i}",
+        "reply": reply,
+    }
+
+
+def _inputs(index, ids):
+    entries = read_log_entries(index.locations(ids), index.log_dir)
+    return [e["user_input_content"] for e in entries]
+
+
+def _index(tmp_path):
+    log_dir = str(tmp_path / "log")
+    os.makedirs(log_dir)
+    return LogIndex(path=os.path.join(log_dir, "logs_index.db"), log_dir=log_dir)
+
+
+def test_sync_reads_only_appended_lines(tmp_path):
+    index = _index(tmp_path)
+    _append(index.log_dir, [_entry(i, "用户正在 IDEA 中调试 Spring 接口") for i in range(3)])
+    assert index.sync() == 3
+    generation = index.generation
+    assert index.sync() == 0
+    assert index.generation == generation
+    _append(index.log_dir, [_entry(3, "用户正在微信聊天", model="gpt-4o-mini")])
+    assert index.sync() == 1
+    assert index.generation == generation + 1
+    assert index.count_matches() == 4
+    assert index.models() == ["gpt-4o-mini", "qwen-vl-plus"]
+
+
+def test_search_long_and_short_terms(tmp_path):
+    index = _index(tmp_path)
+    _append(index.log_dir, [
+        _entry(0, "用户正在 IDEA 中调试 Spring 接口"),
+        _entry(1, "用户正在微信聊天"),
+        _entry(2, "用户在看 B 站视频", model="gpt-4o-mini"),
+        _entry(3, "用户正在调试前端页面", model="gpt-4o-mini"),
+    ])
+    index.sync()
+
+    assert _inputs(index, index.search_ids("spring")) == ["描述用户正在做什么 #0"]
+    assert _inputs(index, index.search_ids("调试")) == ["描述用户正在做什么 #0", "描述用户正在做什么 #3"]
+    assert _inputs(index, index.search_ids("视")) == ["描述用户正在做什么 #2"]
+    assert _inputs(index, index.search_ids("调试 前端页面")) == ["描述用户正在做什么 #3"]
+    assert _inputs(index, index.search_ids("调试", model="gpt-4o-mini")) == ["描述用户正在做什么 #3"]
+    assert index.search_ids("抖音") == []
+    assert index.count_matches("用户") == 4
+
+
+def test_pages_and_capped_count(tmp_path):
+    index = _index(tmp_path)
+    _append(index.log_dir, [_entry(i, "用户正在微信聊天" if i % 2 else "用户正在写代码") for i in range(100)])
+    index.sync()
+
+    pages = []
+    after = None
+    while True:
+        page = index.search_ids("聊天", after_id=after, limit=15)
+        pages.append(page)
+        if len(page) < 15:
+            break
+        after = page[-1]
+    ids = [i for page in pages for i in page]
+    assert ids == index.search_ids("聊天")
+    assert len(ids) == 50
+    assert index.count_matches("聊天") == 50
+    assert index.count_matches("聊天", cap=20) == 20
+
+
+def test_rotated_rows_stay_readable(tmp_path):
+    index = _index(tmp_path)
+    _append(index.log_dir, [_entry(i, "用户正在微信聊天") for i in range(5)])
+    index.sync()
+    ids = index.search_ids()
+    cfg = {"rotate_mb": 0.0001, "rotate_days": 0, "max_total_mb": 0, "compression": "gzip"}
+    assert rotate_log(cfg, log_dir=index.log_dir)
+    _append(index.log_dir, [_entry(5, "用户正在写代码")])
+    assert index.sync() == 1
+
+    assert all(segment.endswith(".gz") for segment, _ in index.locations(ids))
+    assert _inputs(index, ids) == [f"描述用户正在做什么 #{i}" for i in range(5)]
+    assert _inputs(index, index.search_ids("代码")) == ["描述用户正在做什么 #5"]
+
+
+def test_cleared_log_is_reindexed(tmp_path):
+    index = _index(tmp_path)
+    _append(index.log_dir, [_entry(i, "用户正在微信聊天") for i in range(5)])
+    index.sync()
+    os.remove(os.path.join(index.log_dir, "logs.jsonl"))
+    _append(index.log_dir, [_entry(9, "用户正在写代码")])
+    index.sync()
+
+    assert index.search_ids("聊天") == []
+    assert _inputs(index, index.search_ids()) == ["描述用户正在做什么 #9"]
+    index.clear()
+    assert index.count_matches() == 0
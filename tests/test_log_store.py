@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime
+
+from log_store import iter_log_entries, list_log_segments, rotate_log
+
+
+def _append(log_dir, start, count, ts):
+    with open(os.path.join(log_dir, "logs.jsonl"), "a", encoding="utf-8") as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({
+                "time": datetime.fromtimestamp(ts).isoformat(timespec="seconds"),
+                "model": "qwen-vl-plus",
+                "user_input_content": f"描述用户正在做什么 #{i}",
+                "reply": "用户正在 IDEA 中调试接口。" * 4,
+            }, ensure_ascii=False) + "\n")
+
+
+def test_rotated_segments_read_back_in_order(tmp_path):
+    log_dir = str(tmp_path)
+    cfg = {"rotate_mb": 0.001, "rotate_days": 0, "max_total_mb": 0, "compression": "gzip"}
+    ts = datetime(2026, 10, 1, 9, 0).timestamp()
+    for batch in range(5):
+        _append(log_dir, batch * 10, 10, ts)
+        assert rotate_log(cfg, now=ts + batch, log_dir=log_dir)
+    _append(log_dir, 50, 3, ts)
+    assert not rotate_log(cfg, now=ts + 5, log_dir=log_dir)
+
+    segments = list_log_segments(log_dir)
+    assert len(segments) == 5
+    assert all(name.endswith(".jsonl.gz") for name in segments)
+    inputs = [e["user_input_content"] for e in iter_log_entries(log_dir)]
+    assert inputs == [f"描述用户正在做什么 #{i}" for i in range(53)]
+
+
+def test_rotation_by_age_and_same_second_names(tmp_path):
+    log_dir = str(tmp_path)
+    cfg = {"rotate_mb": 0, "rotate_days": 1, "max_total_mb": 0, "compression": "none"}
+    ts = datetime(2026, 10, 1, 9, 0).timestamp()
+    _append(log_dir, 0, 2, ts)
+    assert not rotate_log(cfg, now=ts + 3600, log_dir=log_dir)
+    assert rotate_log(cfg, now=ts + 86400, log_dir=log_dir)
+    _append(log_dir, 2, 2, ts)
+    assert rotate_log(cfg, now=ts + 86400, log_dir=log_dir)
+
+    assert list_log_segments(log_dir) == ["logs-20261002-090000.jsonl", "logs-20261002-090000-1.jsonl"]
+    assert len(list(iter_log_entries(log_dir))) == 4
+
+
+def test_size_cap_drops_oldest_segments(tmp_path):
+    log_dir = str(tmp_path)
+    ts = datetime(2026, 10, 1, 9, 0).timestamp()
+    rotate = {"rotate_mb": 0.001, "rotate_days": 0, "max_total_mb": 0, "compression": "none"}
+    for batch in range(6):
+        _append(log_dir, batch * 10, 10, ts)
+        rotate_log(rotate, now=ts + batch, log_dir=log_dir)
+    segments = list_log_segments(log_dir)
+    size = os.path.getsize(os.path.join(log_dir, segments[0]))
+
+    capped = dict(rotate, max_total_mb=size * 2.5 / (1024 * 1024))
+    assert rotate_log(capped, now=ts + 10, log_dir=log_dir)
+
+    assert list_log_segments(log_dir) == segments[-2:]
+    inputs = [e["user_input_content"] for e in iter_log_entries(log_dir)]
+    assert inputs == [f"描述用户正在做什么 #{i}" for i in range(40, 60)]
+
+
+def test_missing_log_dir_reads_nothing(tmp_path):
+    assert list(iter_log_entries(str(tmp_path / "missing"))) == []
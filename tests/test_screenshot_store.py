@@ -0,0 +1,103 @@
+import os
+import time
+from datetime import datetime
+
+from screenshot_store import RetentionJanitor, ScreenshotIndex
+
+
+THIN_ONLY = {
+    "enabled": True,
+    "max_age_days": 0,
+    "max_total_mb": 0,
+    "max_app_mb": 0,
+    "thin_after_days": 3,
+    "keep_every_nth": 10,
+    "batch": 200,
+}
+
+
+def _make_shots(root, app, count, ts0):
+    day = datetime.fromtimestamp(ts0).strftime("%Y-%m-%d")
+    folder = os.path.join(root, app, day)
+    os.makedirs(folder)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"{app}-{int(ts0) + i}.png")
+        with open(path, "wb") as f:
+            f.write(b"x")
+        paths.append(path)
+    return folder, paths
+
+
+def _run_to_completion(janitor, cfg):
+    for _ in range(1000):
+        if not janitor.run_once(cfg):
+            return
+    raise AssertionError("janitor never finished")
+
+
+def test_thinning_over_batched_passes_keeps_every_nth(tmp_path):
+    root = str(tmp_path / "shots")
+    index = ScreenshotIndex(path=str(tmp_path / "shots.db"), root=root, blob_root=str(tmp_path / "blobs"))
+    ts0 = time.time() - 10 * 86400
+    folder, paths = _make_shots(root, "IDEA", 1000, ts0)
+    for i, path in enumerate(paths):
+        index.add(path, 1, ts0 + i)
+
+    _run_to_completion(RetentionJanitor(index), THIN_ONLY)
+
+    remaining = sorted(os.listdir(folder))
+    assert len(remaining) == 100
+    assert remaining == sorted(os.path.basename(p) for p in paths[::10])
+    assert index.totals()["files"] == 100
+
+
+def test_recent_days_are_not_thinned(tmp_path):
+    root = str(tmp_path / "shots")
+    index = ScreenshotIndex(path=str(tmp_path / "shots.db"), root=root, blob_root=str(tmp_path / "blobs"))
+    ts0 = time.time() - 3600
+    folder, paths = _make_shots(root, "IDEA", 50, ts0)
+    for i, path in enumerate(paths):
+        index.add(path, 1, ts0 + i)
+
+    _run_to_completion(RetentionJanitor(index), THIN_ONLY)
+
+    assert len(os.listdir(folder)) == 50
+
+
+def test_undeletable_file_is_deferred_not_retried_every_pass(tmp_path, monkeypatch):
+    import screenshot_store
+
+    root = str(tmp_path / "shots")
+    index = ScreenshotIndex(path=str(tmp_path / "shots.db"), root=root, blob_root=str(tmp_path / "blobs"))
+    ts0 = time.time() - 3600
+    folder, paths = _make_shots(root, "IDEA", 20, ts0)
+    for i, path in enumerate(paths):
+        index.add(path, 1, ts0 + i)
+    locked = paths[0]
+    locked_rel = os.path.relpath(locked, root)
+    real_remove = os.remove
+
+    def remove(path):
+        if path == locked:
+            raise PermissionError("locked")
+        real_remove(path)
+
+    monkeypatch.setattr(screenshot_store.os, "remove", remove)
+    janitor = RetentionJanitor(index)
+    total_only = {"enabled": True, "max_age_days": 0, "max_total_mb": 10 / (1024 * 1024), "max_app_mb": 0, "thin_after_days": 0, "batch": 200}
+
+    _run_to_completion(janitor, total_only)
+
+    remaining = sorted(os.listdir(folder))
+    assert os.path.basename(locked) in remaining
+    assert len(remaining) == 10
+    assert janitor.stats["failed"] == 1
+    query = "SELECT failures, retry_after FROM shots WHERE path = ?"
+    failures, retry_after = index._conn.execute(query, (locked_rel,)).fetchone()
+    assert failures == 1 and retry_after >= time.time() + janitor.RETRY_DELAY - 5
+
+    # The next failure waits twice as long
+    index.defer([locked_rel], janitor.RETRY_DELAY, janitor.RETRY_MAX_DELAY)
+    failures, retry_after = index._conn.execute(query, (locked_rel,)).fetchone()
+    assert failures == 2 and retry_after >= time.time() + 2 * janitor.RETRY_DELAY - 5
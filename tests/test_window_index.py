@@ -0,0 +1,80 @@
+from window_index import WindowIndex
+
+
+class FakeWindowApi:
+    def __init__(self, windows, images):
+        # windows: {hwnd: pid}, images: {pid: exe path}
+        self.windows = dict(windows)
+        self.images = dict(images)
+        self.calls = {"enum_windows": 0, "process_image": 0}
+
+    def enum_windows(self):
+        self.calls["enum_windows"] += 1
+        return list(self.windows)
+
+    def is_window(self, hwnd):
+        return hwnd in self.windows
+
+    def window_pid(self, hwnd):
+        return self.windows.get(hwnd, 0)
+
+    def process_image(self, pid):
+        self.calls["process_image"] += 1
+        return self.images.get(pid)
+
+
+IDEA = r"C:\Program Files\IDEA\idea64.exe"
+QQ = r"C:\Program Files\QQ\QQ.exe"
+
+
+def test_lookup_maps_each_path_to_its_window():
+    api = FakeWindowApi({10: 1, 20: 2}, {1: IDEA, 2: QQ})
+    index = WindowIndex(api)
+    assert index.lookup([IDEA, QQ, r"C:\missing.exe"]) == {IDEA: 10, QQ: 20}
+
+
+def test_cached_lookup_does_not_enumerate_or_query_processes():
+    api = FakeWindowApi({10: 1, 20: 2}, {1: IDEA, 2: QQ})
+    index = WindowIndex(api)
+    index.lookup([IDEA, QQ])
+    calls = dict(api.calls)
+    for _ in range(5):
+        assert index.lookup([IDEA, QQ]) == {IDEA: 10, QQ: 20}
+    assert api.calls == calls
+    assert index.stats["hits"] == 10
+
+
+def test_closed_window_falls_back_to_re_enumeration():
+    api = FakeWindowApi({10: 1, 11: 1}, {1: IDEA})
+    index = WindowIndex(api)
+    assert index.lookup([IDEA]) == {IDEA: 10}
+    del api.windows[10]
+    # The second window of the same process is still cached
+    assert index.lookup([IDEA]) == {IDEA: 11}
+    assert api.calls["enum_windows"] == 1
+    del api.windows[11]
+    api.windows[30] = 3
+    api.images[3] = IDEA
+    assert index.lookup([IDEA]) == {IDEA: 30}
+    assert api.calls["enum_windows"] == 2
+
+
+def test_reused_hwnd_with_new_pid_is_not_trusted():
+    api = FakeWindowApi({10: 1}, {1: IDEA, 2: QQ})
+    index = WindowIndex(api)
+    assert index.lookup([IDEA]) == {IDEA: 10}
+    # The window handle now belongs to a different process
+    api.windows[10] = 2
+    assert index.lookup([IDEA, QQ]) == {QQ: 10}
+
+
+def test_known_processes_are_not_queried_again():
+    api = FakeWindowApi({10: 1, 20: 2}, {1: IDEA, 2: QQ})
+    index = WindowIndex(api)
+    index.lookup([IDEA])
+    api.windows[30] = 3
+    api.images[3] = r"C:\other.exe"
+    index.lookup([r"C:\other.exe"])
+    # Only the new process needed its image path
+    assert api.calls["process_image"] == 3
+
@@ -0,0 +1,140 @@
+import ctypes
+import os
+import threading
+from ctypes import wintypes
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+class Win32WindowApi:
+    # The few user32/kernel32 calls the window index needs. Any object with the same
+    # methods can be passed to WindowIndex instead, e.g. to exercise it off Windows.
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    def __init__(self):
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+
+    def enum_windows(self):
+        hwnds = []
+
+        @ctypes.WINFUNCTYPE(ctypes.c_bool, wintypes.HWND, wintypes.LPARAM)
+        def enum_proc(hwnd, lparam):
+            if self.user32.IsWindowVisible(hwnd):
+                hwnds.append(hwnd)
+            return True
+
+        self.user32.EnumWindows(enum_proc, 0)
+        return hwnds
+
+    def is_window(self, hwnd):
+        return bool(self.user32.IsWindow(hwnd)) and bool(self.user32.IsWindowVisible(hwnd))
+
+    def window_pid(self, hwnd):
+        pid = wintypes.DWORD()
+        self.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        return pid.value
+
+    def process_image(self, pid):
+        h_process = self.kernel32.OpenProcess(self.PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not h_process:
+            return None
+        try:
+            buf_len = wintypes.DWORD(32767)
+            exe_buf = ctypes.create_unicode_buffer(buf_len.value)
+            if self.kernel32.QueryFullProcessImageNameW(h_process, 0, exe_buf, ctypes.byref(buf_len)):
+                return exe_buf.value
+        finally:
+            self.kernel32.CloseHandle(h_process)
+        return None
+
+
+class WindowIndex:
+    # pid -> image path and image path -> [(hwnd, pid)], filled by full enumerations.
+    # Cached windows are revalidated with IsWindow/GetWindowThreadProcessId only, so a
+    # steady-state lookup never opens another process.
+    def __init__(self, api=None):
+        self.api = api if api is not None else Win32WindowApi()
+        self._lock = threading.Lock()
+        self._pid_images = {}
+        self._path_windows = {}
+        self._hwnd_pids = {}
+        self.stats = {"hits": 0, "misses": 0, "enumerations": 0, "process_queries": 0}
+
+    def lookup(self, exe_paths):
+        targets = {}
+        for exe_path in exe_paths:
+            if exe_path:
+                targets.setdefault(normalize_path(exe_path), []).append(exe_path)
+        found = {}
+        with self._lock:
+            missing = []
+            for target in targets:
+                hwnd = self._cached_hwnd(target)
+                if hwnd is None:
+                    missing.append(target)
+                else:
+                    found[target] = hwnd
+                    self.stats["hits"] += 1
+            if missing:
+                self.stats["misses"] += len(missing)
+                self._enumerate()
+                for target in missing:
+                    windows = self._path_windows.get(target)
+                    if windows:
+                        found[target] = windows[0][0]
+        result = {}
+        for target, hwnd in found.items():
+            for exe_path in targets[target]:
+                result[exe_path] = hwnd
+        return result
+
+    def _cached_hwnd(self, target):
+        windows = self._path_windows.get(target)
+        while windows:
+            hwnd, pid = windows[0]
+            if self.api.is_window(hwnd) and self.api.window_pid(hwnd) == pid:
+                return hwnd
+            windows.pop(0)
+        return None
+
+    def _enumerate(self):
+        self.stats["enumerations"] += 1
+        pid_images = {}
+        path_windows = {}
+        hwnd_pids = {}
+        for hwnd in self.api.enum_windows():
+            pid = self.api.window_pid(hwnd)
+            if not pid:
+                continue
+            hwnd_pids[hwnd] = pid
+            if pid in pid_images:
+                image = pid_images[pid]
+            elif self._hwnd_pids.get(hwnd) == pid and pid in self._pid_images:
+                # Same window still owned by the same pid: the process has not been
+                # replaced, so its image path is still valid.
+                image = self._pid_images[pid]
+            else:
+                self.stats["process_queries"] += 1
+                raw = self.api.process_image(pid)
+                image = normalize_path(raw) if raw else None
+            pid_images[pid] = image
+            if image:
+                path_windows.setdefault(image, []).append((hwnd, pid))
+        self._pid_images = pid_images
+        self._path_windows = path_windows
+        self._hwnd_pids = hwnd_pids
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_window_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = WindowIndex()
+        return _index